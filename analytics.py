@@ -0,0 +1,198 @@
+# analytics.py
+
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Dashboard period -> pandas frequency; weeks start on Monday
+PERIODS = {
+    "Daily": "D",
+    "Weekly": "W-MON",
+    "Monthly": "MS",
+}
+
+# Correlations over fewer exams than this are reported as missing
+MIN_CORRELATION_EXAMS = 3
+
+# Results kept by memoized(), least recently used dropped first
+MEMO_MAX_ENTRIES = 64
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+def _fingerprint(value):
+    # Frames are identified by their contents, so a memoized result is reused
+    # exactly when the filtered data is the same
+    if isinstance(value, pd.DataFrame):
+        digest = pd.util.hash_pandas_object(value, index=False).sum() if len(value) else 0
+        return ("frame", tuple(value.columns), len(value), int(digest))
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint(item) for item in value)
+    return value
+
+def memoized(func):
+    """Cache func's results per input, e.g. the frames of one filter set.
+
+    DataFrame arguments are keyed by a hash of their contents and other
+    arguments by value, so a rerun with the same data reuses the result while
+    new or deleted records compute it again. Callers get a copy.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (
+            func.__name__,
+            _fingerprint(args),
+            tuple(sorted((name, _fingerprint(value)) for name, value in kwargs.items())),
+        )
+        with _memo_lock:
+            if key in _memo:
+                _memo.move_to_end(key)
+                return _memo[key].copy()
+        result = func(*args, **kwargs)
+        with _memo_lock:
+            _memo[key] = result
+            while len(_memo) > MEMO_MAX_ENTRIES:
+                _memo.popitem(last=False)
+        return result.copy()
+    return wrapper
+
+def _keys(df, *columns):
+    # Multi-student frames are analysed per student as well
+    return ["student_id", *columns] if "student_id" in df else list(columns)
+
+def exam_percentage(df):
+    """Return marks_scored as a percentage of maximum_marks for each exam row."""
+    return df["marks_scored"] / df["maximum_marks"] * 100
+
+def period_totals(rollups, freq, by=("subject",)):
+    """Sum the numeric rollup columns per period (labelled by its first day) and by columns."""
+    grouper = pd.Grouper(key="day", freq=freq, closed="left", label="left")
+    totals = rollups.groupby([grouper, *by], observed=True).sum(numeric_only=True).reset_index()
+    return totals.rename(columns={"day": "period"})
+
+def _exam_days(exam_rollups):
+    """Sum the exam rollups per (student, subject, day) and add the percentage."""
+    keys = _keys(exam_rollups, "subject", "day")
+    days = exam_rollups.groupby(keys, observed=True)[["marks_scored", "maximum_marks", "exam_count"]].sum()
+    days = days.reset_index()
+    days["percentage"] = exam_percentage(days)
+    return days
+
+@memoized
+def rolling_scores(exam_rollups, window=3):
+    """Return each subject's score per exam day with a rolling average.
+
+    rolling_percentage is the mean percentage of the last window exam days of
+    the subject (fewer at the start).
+    """
+    days = _exam_days(exam_rollups).sort_values("day", kind="stable")
+    keys = _keys(days, "subject")
+    days["rolling_percentage"] = (
+        days.groupby(keys, observed=True)["percentage"]
+        .rolling(window, min_periods=1).mean()
+        .reset_index(level=list(range(len(keys))), drop=True)
+    )
+    return days.reset_index(drop=True)
+
+@memoized
+def exam_type_trends(exam_rollups, freq):
+    """Return the score per period and exam type, from the exam rollups."""
+    totals = period_totals(exam_rollups, freq, by=("exam_type",))
+    totals["percentage"] = exam_percentage(totals)
+    return totals
+
+def _object_categorical(values):
+    # Categories as objects, since an empty frame's are object and a filled
+    # one's str, and union_categoricals needs them to match
+    values = pd.Categorical(values)
+    return pd.Categorical.from_codes(values.codes, values.categories.astype(object))
+
+def _key_codes(left, right, keys):
+    # One int64 per row that is equal exactly when all keys are, so lookups
+    # join on a number; the frames' categoricals may have different categories
+    left_codes = np.zeros(len(left), dtype="int64")
+    right_codes = np.zeros(len(right), dtype="int64")
+    for key in keys:
+        both = union_categoricals(
+            [_object_categorical(left[key]), _object_categorical(right[key])], ignore_order=True
+        )
+        codes = both.codes.astype("int64") + 1
+        size = len(both.categories) + 1
+        left_codes = left_codes * size + codes[:len(left)]
+        right_codes = right_codes * size + codes[len(left):]
+    return left_codes, right_codes
+
+def _hours_before(probes, hours, column):
+    # Cumulative hours studied strictly before each probe's day
+    found = pd.merge_asof(
+        probes[["group", column]], hours, left_on=column, right_on="day", by="group",
+        allow_exact_matches=False,
+    )
+    return found["cumulative_hours"].fillna(0).to_numpy()
+
+@memoized
+def study_before_exams(exam_rollups, daily_rollups, window_days=14, by=("subject",)):
+    """Return each exam day with the hours studied in the window_days before it.
+
+    by is ("subject",) for the subject's total hours or ("subject", "chapter")
+    for one row per chapter of the exam's subject. Hours come from the daily
+    rollups: a cumulative sum per key is looked up with merge_asof at the exam
+    day and at the start of the window, and the difference is the hours in
+    between. The exam day itself is not counted, and exams of a subject with
+    no study hours are kept with hours_before 0.
+    """
+    exams = _exam_days(exam_rollups)
+    exams["group"], groups = _key_codes(exams, daily_rollups, _keys(exams, "subject"))
+    hours = pd.DataFrame({
+        "group": groups,
+        # Rollup and exam days can differ in resolution, and merge_asof needs one
+        "day": daily_rollups["day"].to_numpy(dtype="datetime64[ns]"),
+        "studied_hours": daily_rollups["studied_hours"].to_numpy(dtype="float64"),
+    })
+    if "chapter" in by:
+        chapters = pd.Categorical(daily_rollups["chapter"])
+        hours["chapter"] = chapters
+        exams = exams.merge(hours[["group", "chapter"]].drop_duplicates(), on="group")
+        size = len(chapters.categories) + 1
+        hours["group"] = hours["group"] * size + chapters.codes
+        exams["group"] = exams["group"] * size + exams["chapter"].cat.codes
+        hours = hours.drop(columns="chapter")
+
+    hours = hours.groupby(["group", "day"])["studied_hours"].sum().reset_index().sort_values("day", kind="stable")
+    hours["cumulative_hours"] = hours.groupby("group")["studied_hours"].cumsum()
+    hours = hours.drop(columns="studied_hours")
+
+    # Window starts are in the same order as the exam days, so one sort serves both lookups
+    exams = exams.sort_values("day", kind="stable").reset_index(drop=True)
+    exams["day"] = exams["day"].astype("datetime64[ns]")
+    exams["window_start"] = exams["day"] - pd.Timedelta(days=window_days)
+    exams["hours_before"] = _hours_before(exams, hours, "day") - _hours_before(exams, hours, "window_start")
+    exams = exams.drop(columns=["group", "window_start"])
+    return exams.sort_values([*_keys(exams, *by), "day"]).reset_index(drop=True)
+
+@memoized
+def effort_correlation(pairs, by=("subject",)):
+    """Return the Pearson correlation of hours_before and percentage per by group.
+
+    pairs is a study_before_exams() frame; students are pooled. Sums of the
+    products are taken per group in one pass, so no per-group Python runs.
+    """
+    x = pairs["hours_before"].to_numpy(dtype="float64")
+    y = pairs["percentage"].to_numpy(dtype="float64")
+    terms = pd.DataFrame({"x": x, "y": y, "xx": x * x, "yy": y * y, "xy": x * y})
+    groups = terms.groupby([pairs[column].reset_index(drop=True) for column in by], observed=True)
+    sums = groups[["x", "y", "xx", "yy", "xy"]].sum()
+    n = groups.size()
+    covariance = sums["xy"] - sums["x"] * sums["y"] / n
+    spread = np.sqrt((sums["xx"] - sums["x"] ** 2 / n) * (sums["yy"] - sums["y"] ** 2 / n))
+    correlation = (covariance / spread.where(spread > 0)).where(n >= MIN_CORRELATION_EXAMS)
+    return pd.DataFrame({
+        "exams": n,
+        "average_hours": sums["x"] / n,
+        "average_percentage": sums["y"] / n,
+        "correlation": correlation,
+    }).reset_index()
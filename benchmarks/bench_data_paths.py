@@ -0,0 +1,265 @@
+# bench_data_paths.py
+#
+# Measures how the connector and dashboard data paths scale with history size.
+# Runs without network access against mongomock (default), a local mongod or
+# the SQLite backend (mongomock must be installed for the default):
+#
+#   python benchmarks/bench_data_paths.py --backend mongomock --sizes 1000,10000
+#   python benchmarks/bench_data_paths.py --backend mongod --mongo-uri mongodb://localhost:27017
+#   python benchmarks/bench_data_paths.py --backend sqlite --sizes 1000,100000,1000000
+#   python benchmarks/bench_data_paths.py --backend sqlite --sizes 10000 --students 1,10,100
+#
+# Each size is one student's history; --students loads that many students
+# with the same history so the per-student queries (run for the first student)
+# can be checked to stay flat as the total volume grows.
+#
+# --save-baseline writes the results as JSON; --compare checks a run against a
+# saved baseline and exits with status 1 if any operation regressed. Keep
+# baselines per machine, e.g. benchmarks/baseline-<backend>.json. The
+# committed baselines are reference runs of
+#
+#   python benchmarks/bench_data_paths.py --backend sqlite --sizes 1000,10000,100000 \
+#       --save-baseline benchmarks/baseline-sqlite.json
+#   python benchmarks/bench_data_paths.py --backend mongomock --sizes 1000 \
+#       --save-baseline benchmarks/baseline-mongomock.json
+#
+# and only compare well on similar hardware; re-save them on yours first and
+# compare a change against that, e.g.
+#
+#   python benchmarks/bench_data_paths.py --backend sqlite --sizes 1000,10000 \
+#       --compare benchmarks/baseline-sqlite.json --tolerance 0.5
+
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+BENCH_DB_NAME = "studytracker_bench"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the study tracker data paths.")
+    parser.add_argument("--backend", choices=["mongomock", "mongod", "sqlite"], default="mongomock")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017",
+                        help="URI of the local mongod used by --backend mongod")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated study record counts, e.g. 1000,10000,1000000")
+    parser.add_argument("--students", default="1",
+                        help="comma-separated student counts, each loaded with a history of every size")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per operation")
+    parser.add_argument("--seed", type=int, default=10)
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results to this JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="compare results with this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown/memory growth before a regression is reported")
+    return parser.parse_args()
+
+# ---- BACKEND SETUP ----
+
+def setup_backend(args):
+    """Select the backend through storage.py and point it at a throwaway database."""
+    os.environ["STUDY_TRACKER_BACKEND"] = "sqlite" if args.backend == "sqlite" else "mongo"
+    import storage
+
+    backend = storage.backend
+    if args.backend == "sqlite":
+        backend.SQLITE_PATH = os.path.join(tempfile.mkdtemp(prefix="study_bench_"), "bench.db")
+    else:
+        # Measure the database path, not the read cache
+        backend.CACHE_TTL_SECONDS = 0
+        backend.DB_NAME = BENCH_DB_NAME
+        if args.backend == "mongomock":
+            import mongomock
+            backend._client = mongomock.MongoClient()
+        else:
+            backend.MONGO_URI = args.mongo_uri
+    return backend
+
+def reset_database(backend, args):
+    if args.backend == "sqlite":
+        conn = backend.get_connection()
+        for table in (*backend.COLLECTIONS, *backend.ROLLUP_COLUMNS):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        backend._db_initialised = False
+    else:
+        backend.get_client().drop_database(BENCH_DB_NAME)
+        backend._db_initialised = False
+    backend.init_db()
+
+# ---- SYNTHETIC DATA ----
+
+def generate_history(size, seed):
+    """Build study records, plans (half as many) and exams (a tenth) over ~size/4 days."""
+    from constants import SUBJECT_CHAPTERS, BOOK_MATERIALS, EXAM_TYPES
+
+    rng = random.Random(seed)
+    subjects = list(SUBJECT_CHAPTERS)
+    days = max(size // 4, 1)
+    start = date.today() - timedelta(days=days)
+
+    def pick_day():
+        return start + timedelta(days=rng.randrange(days))
+
+    def pick_subject_chapter():
+        subject = rng.choice(subjects)
+        return subject, rng.choice(SUBJECT_CHAPTERS[subject])
+
+    study = []
+    for _ in range(size):
+        subject, chapter = pick_subject_chapter()
+        study.append({
+            "date": pick_day(), "subject": subject, "chapter": chapter,
+            "book_material": rng.choice(BOOK_MATERIALS),
+            "hours_studied": rng.choice([0.5, 1.0, 1.5, 2.0, 3.0]), "remarks": "",
+        })
+    plans = []
+    for _ in range(max(size // 2, 1)):
+        subject, chapter = pick_subject_chapter()
+        plans.append({
+            "plan_date": pick_day(), "subject": subject, "chapter": chapter,
+            "planned_hours": rng.choice([1.0, 2.0, 3.0]), "remarks": "",
+        })
+    exams = []
+    for _ in range(max(size // 10, 1)):
+        maximum = rng.choice([20, 40, 80, 100])
+        exams.append({
+            "exam_date": pick_day(), "subject": rng.choice(subjects),
+            "exam_type": rng.choice(EXAM_TYPES), "maximum_marks": maximum,
+            "marks_scored": rng.randint(0, maximum), "improvements": "",
+        })
+    return {"study_records": study, "study_plans": plans, "exam_records": exams}, start
+
+def student_ids(count):
+    return [f"student-{number:04d}" for number in range(count)]
+
+def load_history(backend, student_id, history, chunk_size=5000):
+    for collection_name, docs in history.items():
+        for offset in range(0, len(docs), chunk_size):
+            backend.insert_records(student_id, collection_name, docs[offset:offset + chunk_size])
+
+# ---- MEASUREMENT ----
+
+def measure(func, repeat):
+    """Return median/min latency over repeat runs and peak traced memory of one run."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+def operations(backend, student_id, start):
+    """Return {name: callable} for every benchmarked data path of one student."""
+    from analytics import PERIODS, effort_correlation, exam_percentage, period_totals, rolling_scores, study_before_exams
+    from exporter import export_all_data
+
+    month_start = start + timedelta(days=30)
+    month_end = month_start + timedelta(days=30)
+    exams = backend.get_exam_records(student_id)
+    exam_rollups = backend.get_exam_rollups(student_id)
+    daily_rollups = backend.get_daily_rollups(student_id)
+
+    def export(fmt):
+        with export_all_data(student_id, fmt):
+            pass
+
+    return {
+        "get_study_records": lambda: backend.get_study_records(student_id),
+        "get_study_records_filtered": lambda: backend.get_study_records(
+            student_id, subjects=["Math", "Science"], start_date=month_start, end_date=month_end,
+            fields=["date", "subject", "chapter", "hours_studied"],
+        ),
+        "get_study_records_page": lambda: backend.get_study_records_page(student_id, page_size=50),
+        "planned_vs_actual": lambda: backend.get_planned_vs_actual(student_id),
+        "weekly_totals_rollup": lambda: period_totals(backend.get_daily_rollups(student_id), PERIODS["Weekly"]),
+        "exam_percentage": lambda: exam_percentage(exams).round(1).astype(str) + "%",
+        # Analytics are memoized; __wrapped__ times the computation itself
+        "rolling_scores": lambda: rolling_scores.__wrapped__(exam_rollups),
+        "effort_correlation": lambda: effort_correlation.__wrapped__(
+            study_before_exams.__wrapped__(exam_rollups, daily_rollups)
+        ),
+        "class_summary": lambda: backend.get_class_summary(),
+        "export_xlsx": lambda: export("xlsx"),
+        "export_csv": lambda: export("csv"),
+    }
+
+def run(args):
+    backend = setup_backend(args)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    student_counts = [int(count) for count in args.students.split(",")]
+    results = {"backend": args.backend, "results": {}}
+    for size, students in itertools.product(sizes, student_counts):
+        reset_database(backend, args)
+        history, start = generate_history(size, args.seed)
+        started = time.perf_counter()
+        for student_id in student_ids(students):
+            load_history(backend, student_id, history)
+        total_rows = sum(len(docs) for docs in history.values())
+        print(f"\n== {size} study records x {students} students "
+              f"({total_rows * students} rows loaded in {time.perf_counter() - started:.1f}s)")
+        print(f"{'operation':<28}{'median ms':>12}{'min ms':>12}{'rows/s':>14}{'peak MB':>10}")
+        # Keys of single-student runs match baselines saved before --students
+        suffix = f"@{size}" if students == 1 else f"@{size}x{students}"
+        for name, func in operations(backend, student_ids(1)[0], start).items():
+            try:
+                stats = measure(func, args.repeat)
+            except NotImplementedError as e:
+                # e.g. mongomock lacks $unionWith
+                print(f"{name:<28}  skipped: {str(e).splitlines()[0][:60]}")
+                continue
+            stats["rows_per_s"] = total_rows / stats["median_s"] if stats["median_s"] else 0.0
+            results["results"][name + suffix] = stats
+            print(f"{name:<28}{stats['median_s'] * 1000:>12.1f}{stats['min_s'] * 1000:>12.1f}"
+                  f"{stats['rows_per_s']:>14,.0f}{stats['peak_mb']:>10.1f}")
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print and return the operations slower or heavier than baseline beyond tolerance."""
+    regressions = []
+    for key, stats in results["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        for metric in ("median_s", "peak_mb"):
+            if base[metric] and stats[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {base[metric]:.4g} -> {stats[metric]:.4g}")
+    if baseline.get("backend") != results["backend"]:
+        print(f"\nwarning: baseline backend is {baseline.get('backend')}, this run is {results['backend']}")
+    print("\nRegressions:" if regressions else "\nNo regressions against baseline.")
+    for line in regressions:
+        print("  " + line)
+    return regressions
+
+def main():
+    args = parse_args()
+    results = run(args)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
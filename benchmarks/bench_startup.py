@@ -0,0 +1,78 @@
+# bench_startup.py
+#
+# Measures the app's cold start: each run is a fresh Python process that
+# renders study_tracker.py once with Streamlit's AppTest and reports the
+# time to import the script's modules, to first paint (header sent) and to
+# the end of the first script run. Uses the SQLite backend on a copy of a
+# database so no network is needed:
+#
+#   python benchmarks/bench_startup.py --runs 5
+#   python benchmarks/bench_startup.py --section "📊 Study Dashboard"
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process; prints one JSON line of timings in ms
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_ms = (time.perf_counter() - started) * 1000
+at = AppTest.from_file({script!r}, default_timeout=120)
+if {section!r}:
+    at.session_state["section"] = {section!r}
+at.run()
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+from instrumentation import get_metrics
+metrics = get_metrics()
+print(json.dumps({{
+    "import_streamlit_ms": streamlit_ms,
+    "first_paint_ms": metrics["app.first_paint.cold"]["sum"] * 1000,
+    "script_ms": metrics["app.script.cold"]["sum"] * 1000,
+    "heavy_modules": sorted(m for m in ("pandas", "pymongo", "plotly.express", "xlsxwriter") if m in sys.modules),
+}}))
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the study tracker cold start.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--section", default="", help="section to open, default the first")
+    parser.add_argument("--database", default=os.path.join(ROOT, "study_tracker.db"),
+                        help="SQLite database copied for the runs")
+    return parser.parse_args()
+
+def run_once(args, db_path):
+    env = dict(os.environ, STUDY_TRACKER_BACKEND="sqlite", STUDY_TRACKER_SQLITE_PATH=db_path)
+    code = CHILD.format(root=ROOT, script=os.path.join(ROOT, "study_tracker.py"), section=args.section)
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="study_startup_")
+    db_path = os.path.join(workdir, "study_tracker.db")
+    if os.path.exists(args.database):
+        shutil.copy(args.database, db_path)
+    try:
+        runs = [run_once(args, db_path) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'metric':<22}{'median ms':>12}{'min ms':>12}")
+    for metric in ("import_streamlit_ms", "first_paint_ms", "script_ms"):
+        values = [run[metric] for run in runs]
+        print(f"{metric:<22}{statistics.median(values):>12.1f}{min(values):>12.1f}")
+    print("heavy modules loaded after the first run:", ", ".join(runs[-1]["heavy_modules"]) or "none")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# constants.py
+
+SUBJECT_CHAPTERS = {
+    "Science": [
+        "Light - Reflection and Refraction",
+        "Human Eye and Colourful World",
+        "Electricity",
+        "Magnetic Effects of Electric Current",
+        "Sources of Energy",
+        "Life Processes",
+        "Control and Coordination",
+        "How do Organisms Reproduce",
+        "Heredity and Evolution",
+        "Our Environment",
+        "Natural Resource Management",
+        "Acids, Bases and Salts",
+        "Metals and Non-metals",
+        "Carbon and its Compounds",
+        "Periodic Classification of Elements"
+    ],
+    "Math": [
+        "Real Numbers",
+        "Polynomials",
+        "Pair of Linear Equations in Two Variables",
+        "Quadratic Equations",
+        "Arithmetic Progressions",
+        "Triangles",
+        "Coordinate Geometry",
+        "Introduction to Trigonometry",
+        "Some Applications of Trigonometry",
+        "Circles",
+        "Constructions",
+        "Areas Related to Circles",
+        "Surface Areas and Volumes",
+        "Statistics",
+        "Probability"
+    ],
+    "English": [
+        "A Letter to God",
+        "Nelson Mandela: Long Walk to Freedom",
+        "Two Stories about Flying",
+        "From the Diary of Anne Frank",
+        "Glimpses of India",
+        "Mijbil the Otter",
+        "Madam Rides the Bus",
+        "The Sermon at Benares",
+        "The Proposal",
+        "A Triumph of Surgery",
+        "The Thief's Story",
+        "The Midnight Visitor",
+        "A Question of Trust",
+        "Footprints without Feet",
+        "The Making of a Scientist",
+        "The Necklace",
+        "Bholi",
+        "The Book That Saved the Earth"
+    ],
+    "SS": [
+        "Resources and Development",
+        "Forest and Wildlife Resources",
+        "Water Resources",
+        "Agriculture",
+        "Minerals and Energy Resources",
+        "Manufacturing Industries",
+        "Lifelines of National Economy",
+        "The Rise of Nationalism in Europe",
+        "Nationalism in India",
+        "The Making of a Global World",
+        "The Age of Industrialisation",
+        "Print Culture and the Modern World",
+        "Power Sharing",
+        "Federalism",
+        "Democracy and Diversity",
+        "Gender, Religion and Caste",
+        "Popular Struggles and Movements",
+        "Political Parties",
+        "Outcomes of Democracy",
+        "Challenges to Democracy",
+        "Development",
+        "Sectors of Indian Economy",
+        "Money and Credit",
+        "Globalisation and the Indian Economy",
+        "Consumer Rights"
+    ],
+    "Gujarati": [
+        "પ્રથમ અધ્યાન: સમજદારીનો માર્ગ",
+        "બીજું અધ્યાય: કુદરતના રંગ",
+        "તૃતીય અધ്യાય: જીવનના મૂલ્યો",
+        "ચોથું અધ્યાય: સંસ્કૃતિ અને પરંપરા",
+        "પાંચમું અધ્યાય: વૈજ્ઞાનિક વિચાર",
+        "છઠ્ઠું અધ્યાય: સાહિત્યનું મહત્વ",
+        "સાતમું અધ્યાય: સમાજ અને એના મુદ્દા",
+        "આઠમું અધ્યાય: જીવન કૌશલ્ય",
+        "નવમું અધ્યાય: નાયક અને પ્રેરણા",
+        "દસમું અધ્યાય: નિવૃત્તિ અને આખરી અભ્યાસ"
+    ]
+}
+
+BOOK_MATERIALS = [
+    "CBSE Textbook",
+    "KS QB",
+    "US Notes",
+    "KS Power Book",
+    "KS Objective Book",
+    "US Worksheet",
+    "Deepa mam Class"
+]
+
+EXAM_TYPES = [
+    "School Exam",
+    "KS Class Test",
+    "Mock Test",
+    "Deepa mam Class",
+    "Others"
+]
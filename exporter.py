@@ -0,0 +1,133 @@
+# exporter.py
+
+import csv
+import io
+import tempfile
+import zipfile
+
+from storage import prefetch_record_batches
+
+# Rows fetched from the database and written per step. Peak memory is bounded
+# by this, not by the size of the collections.
+EXPORT_BATCH_SIZE = 1000
+
+# Output is kept in memory up to this size, then spilled to a temporary file
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+# (collection, sheet/file name, exported fields) in export order
+EXPORT_TABLES = [
+    ("study_records", "Study Records",
+     ["_id", "date", "subject", "chapter", "book_material", "hours_studied", "remarks", "created_at"]),
+    ("exam_records", "Exam Records",
+     ["_id", "exam_date", "subject", "exam_type", "maximum_marks", "marks_scored", "improvements", "created_at"]),
+    ("study_plans", "Study Plans",
+     ["_id", "plan_date", "subject", "chapter", "planned_hours", "remarks", "created_at"]),
+]
+
+EXPORT_FORMATS = {
+    "xlsx": ("study_tracker_export.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("study_tracker_export_csv.zip", "application/zip"),
+    "parquet": ("study_tracker_export_parquet.zip", "application/zip"),
+}
+
+def _header(field):
+    # MongoDB _id is exported as ID
+    return "ID" if field == "_id" else field
+
+def _rows(batch, fields):
+    return [[doc.get(field) for field in fields] for doc in batch]
+
+def _write_xlsx(output, tables):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd",
+        "remove_timezone": True,
+    })
+    for collection_name, sheet_name, fields in EXPORT_TABLES:
+        worksheet = None
+        row_num = 1
+        for batch in tables[collection_name]:
+            if worksheet is None:
+                # Sheets are only created for collections that have data
+                worksheet = workbook.add_worksheet(sheet_name)
+                worksheet.write_row(0, 0, [_header(field) for field in fields])
+            for row in _rows(batch, fields):
+                worksheet.write_row(row_num, 0, row)
+                row_num += 1
+    workbook.close()
+
+def _write_csv(output, tables):
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for collection_name, sheet_name, fields in EXPORT_TABLES:
+            with archive.open(f"{sheet_name}.csv", "w") as member:
+                text = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow([_header(field) for field in fields])
+                for batch in tables[collection_name]:
+                    writer.writerows(_rows(batch, fields))
+                text.flush()
+                text.detach()
+
+def _parquet_schema(pa, fields):
+    types = {
+        "date": pa.timestamp("ms"),
+        "exam_date": pa.timestamp("ms"),
+        "plan_date": pa.timestamp("ms"),
+        "created_at": pa.timestamp("ms"),
+        "hours_studied": pa.float64(),
+        "planned_hours": pa.float64(),
+        "maximum_marks": pa.int64(),
+        "marks_scored": pa.int64(),
+    }
+    return pa.schema([(_header(field), types.get(field, pa.string())) for field in fields])
+
+def _write_parquet(output, tables):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow).")
+
+    # Parquet is already compressed, so members are stored as-is
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for collection_name, sheet_name, fields in EXPORT_TABLES:
+            schema = _parquet_schema(pa, fields)
+            with archive.open(f"{sheet_name}.parquet", "w") as member:
+                with pq.ParquetWriter(member, schema) as writer:
+                    for batch in tables[collection_name]:
+                        columns = list(zip(*_rows(batch, fields)))
+                        writer.write_batch(pa.record_batch(
+                            [pa.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                            schema=schema,
+                        ))
+
+_WRITERS = {
+    "xlsx": _write_xlsx,
+    "csv": _write_csv,
+    "parquet": _write_parquet,
+}
+
+def export_all_data(student_id, fmt="xlsx", batch_size=EXPORT_BATCH_SIZE):
+    """Export a student's records of all three collections and return the file, rewound to the start.
+
+    Records are streamed from database cursors in batches of batch_size and
+    written incrementally: xlsx uses xlsxwriter's constant-memory mode (one
+    sheet per collection), csv and parquet produce a zip with one file per
+    collection. All three collections are read concurrently, a few batches
+    ahead of the writer. The result is a SpooledTemporaryFile that moves to
+    disk once it exceeds SPOOL_MAX_BYTES.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    collection_names = [collection_name for collection_name, _, _ in EXPORT_TABLES]
+    try:
+        with prefetch_record_batches(student_id, collection_names, batch_size) as tables:
+            _WRITERS[fmt](output, tables)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
@@ -0,0 +1,77 @@
+# frames.py
+#
+# Column types of the DataFrames returned by the storage backends. Enumerated
+# fields are categoricals over the values in constants.py, student IDs are
+# categoricals over the values present, dates are datetime64, hours float32
+# and marks int16. IDs are Arrow-backed strings when pyarrow is installed.
+
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+from constants import SUBJECT_CHAPTERS, BOOK_MATERIALS, EXAM_TYPES
+
+try:
+    import pyarrow  # noqa: F401
+    ID_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    ID_DTYPE = object
+
+CATEGORIES = {
+    "subject": list(SUBJECT_CHAPTERS),
+    "chapter": list(dict.fromkeys(chapter for chapters in SUBJECT_CHAPTERS.values() for chapter in chapters)),
+    "book_material": list(BOOK_MATERIALS),
+    "exam_type": list(EXAM_TYPES),
+}
+CATEGORY_DTYPES = {column: pd.CategoricalDtype(values) for column, values in CATEGORIES.items()}
+
+DATE_COLUMNS = ("date", "exam_date", "plan_date", "created_at", "day")
+
+# Per-record measures; summed rollup columns keep their wider types
+NUMERIC_DTYPES = {
+    "hours_studied": "float32",
+    "planned_hours": "float32",
+    "marks_scored": "int16",
+    "maximum_marks": "int16",
+}
+
+def _category_dtype(column, values):
+    """Return the shared dtype for column, widened by values missing from constants.py."""
+    dtype = CATEGORY_DTYPES[column]
+    known = set(dtype.categories)
+    extra = [value for value in pd.unique(values.dropna()) if value not in known]
+    if not extra:
+        return dtype
+    return pd.CategoricalDtype([*dtype.categories, *sorted(extra, key=str)])
+
+def _numeric_dtype(values, dtype):
+    # Whole-number columns with gaps use the nullable variant
+    if dtype.startswith("int") and values.isna().any():
+        return dtype.capitalize()
+    return dtype
+
+def compact_frame(df, numeric=True):
+    """Convert the known columns of df to their compact dtypes in place and return it.
+
+    Columns that already have the target dtype are left alone, so frames can
+    be compacted again after a concat. numeric=False keeps the number columns
+    as they are, e.g. for summed rollups where int16 could overflow.
+    """
+    for column in df.columns:
+        values = df[column]
+        if column == "_id":
+            if values.dtype != ID_DTYPE:
+                df[column] = values.astype(str).astype(ID_DTYPE)
+        elif column == "student_id":
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                df[column] = values.astype("category")
+        elif column in CATEGORY_DTYPES:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                df[column] = values.astype(_category_dtype(column, values))
+        elif column in DATE_COLUMNS:
+            if not is_datetime64_any_dtype(values.dtype):
+                df[column] = pd.to_datetime(values)
+        elif numeric and column in NUMERIC_DTYPES:
+            dtype = _numeric_dtype(values, NUMERIC_DTYPES[column])
+            if values.dtype != dtype:
+                df[column] = values.astype(dtype)
+    return df
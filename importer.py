@@ -0,0 +1,180 @@
+# importer.py
+
+import math
+from datetime import date, datetime
+
+from constants import SUBJECT_CHAPTERS, BOOK_MATERIALS, EXAM_TYPES
+from exporter import EXPORT_TABLES
+from storage import insert_records
+
+# Validated rows sent to the database per insert call
+IMPORT_CHUNK_SIZE = 500
+
+def _is_blank(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value == ""
+
+def _text(value):
+    return "" if _is_blank(value) else str(value)
+
+def _to_date(value, field):
+    if _is_blank(value):
+        raise ValueError(f"{field} is required")
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip()).date()
+    except ValueError:
+        raise ValueError(f"{field} is not a valid date: {value!r}")
+
+def _to_number(value, field, minimum, maximum, integer=False):
+    if _is_blank(value):
+        raise ValueError(f"{field} is required")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a number: {value!r}")
+    if integer:
+        if not number.is_integer():
+            raise ValueError(f"{field} must be a whole number: {value!r}")
+        number = int(number)
+    if not minimum <= number <= maximum:
+        raise ValueError(f"{field} must be between {minimum} and {maximum}: {value!r}")
+    return number
+
+def _check_subject_chapter(record):
+    subject = record.get("subject")
+    if subject not in SUBJECT_CHAPTERS:
+        raise ValueError(f"Unknown subject: {subject!r}")
+    chapter = record.get("chapter")
+    if chapter not in SUBJECT_CHAPTERS[subject]:
+        raise ValueError(f"Unknown chapter for {subject}: {chapter!r}")
+    return subject, chapter
+
+def validate_study_record(record):
+    """Return a clean study record document, or raise ValueError."""
+    subject, chapter = _check_subject_chapter(record)
+    book_material = record.get("book_material")
+    if book_material not in BOOK_MATERIALS:
+        raise ValueError(f"Unknown book/material: {book_material!r}")
+    hours_studied = _to_number(record.get("hours_studied"), "hours_studied", 0, 24)
+    if hours_studied <= 0:
+        raise ValueError("hours_studied must be greater than 0")
+    return {
+        "date": _to_date(record.get("date"), "date"),
+        "subject": subject,
+        "chapter": chapter,
+        "book_material": book_material,
+        "hours_studied": hours_studied,
+        "remarks": _text(record.get("remarks")),
+    }
+
+def validate_exam_record(record):
+    """Return a clean exam record document, or raise ValueError."""
+    subject = record.get("subject")
+    if subject not in SUBJECT_CHAPTERS:
+        raise ValueError(f"Unknown subject: {subject!r}")
+    exam_type = record.get("exam_type")
+    if exam_type not in EXAM_TYPES:
+        raise ValueError(f"Unknown exam type: {exam_type!r}")
+    maximum_marks = _to_number(record.get("maximum_marks"), "maximum_marks", 1, 1000, integer=True)
+    marks_scored = _to_number(record.get("marks_scored"), "marks_scored", 0, 1000, integer=True)
+    if marks_scored > maximum_marks:
+        raise ValueError("marks_scored cannot be more than maximum_marks")
+    return {
+        "exam_date": _to_date(record.get("exam_date"), "exam_date"),
+        "subject": subject,
+        "exam_type": exam_type,
+        "maximum_marks": maximum_marks,
+        "marks_scored": marks_scored,
+        "improvements": _text(record.get("improvements")),
+    }
+
+def validate_study_plan(record):
+    """Return a clean study plan document, or raise ValueError."""
+    subject, chapter = _check_subject_chapter(record)
+    planned_hours = _to_number(record.get("planned_hours"), "planned_hours", 0, 24)
+    if planned_hours <= 0:
+        raise ValueError("planned_hours must be greater than 0")
+    return {
+        "plan_date": _to_date(record.get("plan_date"), "plan_date"),
+        "subject": subject,
+        "chapter": chapter,
+        "planned_hours": planned_hours,
+        "remarks": _text(record.get("remarks")),
+    }
+
+VALIDATORS = {
+    "study_records": validate_study_record,
+    "exam_records": validate_exam_record,
+    "study_plans": validate_study_plan,
+}
+
+def _iter_rows(records):
+    """Yield (row, record) pairs from a DataFrame or an iterable of dicts."""
+    if hasattr(records, "to_dict") and hasattr(records, "index"):
+        # DataFrame: rows are reported by index label
+        yield from zip(records.index, records.to_dict("records"))
+    else:
+        yield from enumerate(records)
+
+def bulk_insert(student_id, collection_name, records, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate a student's records and insert them in unordered chunks of chunk_size.
+
+    Invalid rows are skipped rather than aborting the import. Returns a dict
+    with the number of rows inserted and an "errors" list of (row, message),
+    where row is the DataFrame index label or the position in the iterable.
+    """
+    validate = VALIDATORS[collection_name]
+    result = {"inserted": 0, "errors": []}
+    chunk, chunk_rows = [], []
+
+    def flush():
+        inserted, errors = insert_records(student_id, collection_name, chunk)
+        result["inserted"] += inserted
+        result["errors"].extend((chunk_rows[position], message) for position, message in errors)
+        chunk.clear()
+        chunk_rows.clear()
+
+    for row, record in _iter_rows(records):
+        try:
+            chunk.append(validate(record))
+        except ValueError as e:
+            result["errors"].append((row, str(e)))
+            continue
+        chunk_rows.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return result
+
+def bulk_add_study_records(student_id, records, chunk_size=IMPORT_CHUNK_SIZE):
+    return bulk_insert(student_id, "study_records", records, chunk_size)
+
+def bulk_add_exam_records(student_id, records, chunk_size=IMPORT_CHUNK_SIZE):
+    return bulk_insert(student_id, "exam_records", records, chunk_size)
+
+def bulk_add_study_plans(student_id, records, chunk_size=IMPORT_CHUNK_SIZE):
+    return bulk_insert(student_id, "study_plans", records, chunk_size)
+
+def import_workbook(student_id, file, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import an xlsx in the layout written by export_all_data("xlsx") for a student.
+
+    Each known sheet is imported into its collection; the ID and created_at
+    columns are ignored. Returns {collection_name: bulk_insert result} for
+    the sheets present. Error rows are reported as spreadsheet row numbers.
+    """
+    import pandas as pd
+
+    sheets = pd.read_excel(file, sheet_name=None)
+    results = {}
+    for collection_name, sheet_name, _ in EXPORT_TABLES:
+        if sheet_name not in sheets:
+            continue
+        df = sheets[sheet_name].drop(columns=["ID", "created_at"], errors="ignore")
+        # Header is row 1 in the sheet, so data starts at row 2
+        df.index = df.index + 2
+        results[collection_name] = bulk_insert(student_id, collection_name, df, chunk_size)
+    return results
@@ -0,0 +1,169 @@
+# instrumentation.py
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Set to 1 to emit every timing as a JSON log line on the study_tracker.perf logger
+LOG_TIMINGS = os.environ.get("STUDY_TRACKER_PERF_LOG", "") == "1"
+# When set, Prometheus text metrics are served on http://<host>:<port>/metrics
+METRICS_PORT = os.environ.get("STUDY_TRACKER_METRICS_PORT")
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("study_tracker.perf")
+
+_lock = threading.Lock()
+_metrics = {}
+_stats_sources = {}
+_run = threading.local()
+_started = set()
+_server = None
+
+# ---- RECORDING ----
+
+def record(name, seconds, error=False):
+    """Add one timing for name to the process-wide metrics and the current run."""
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = {
+                "count": 0, "errors": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS),
+            }
+        metric["count"] += 1
+        metric["errors"] += int(error)
+        metric["sum"] += seconds
+        metric["max"] = max(metric["max"], seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                metric["buckets"][i] += 1
+
+    timings = getattr(_run, "timings", None)
+    if timings is not None:
+        timings.append({"operation": name, "ms": seconds * 1000, "error": error})
+    if LOG_TIMINGS:
+        logger.info(json.dumps({"event": "timing", "operation": name, "ms": round(seconds * 1000, 3), "error": error}))
+
+class timed(ContextDecorator):
+    """Time a block (with timed(name):) or every call of a function (@timed(name))."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call keeps concurrent calls independent
+        return timed(self.name)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self._started, error=exc_type is not None)
+        return False
+
+def record_startup(name, seconds):
+    """Record a startup timing; the first one in this process is also kept as <name>.cold."""
+    with _lock:
+        cold = name not in _started
+        _started.add(name)
+    record(name, seconds)
+    if cold:
+        record(name + ".cold", seconds)
+
+# ---- PER-RERUN TIMINGS ----
+
+def start_run():
+    """Start collecting timings for the current Streamlit script run (this thread)."""
+    _run.timings = []
+
+def get_run_timings():
+    """Return the timings recorded in this thread since start_run(), in order."""
+    return list(getattr(_run, "timings", None) or [])
+
+def bind_run(func):
+    """Wrap func so timings it records on another thread go to the caller's current run."""
+    timings = getattr(_run, "timings", None)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_run, "timings", None)
+        _run.timings = timings
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _run.timings = previous
+    return wrapper
+
+# ---- EXPORT ----
+
+def register_stats(prefix, source):
+    """Publish the numeric values of source() as gauges named study_tracker_<prefix>_<key>."""
+    _stats_sources[prefix] = source
+
+def get_metrics():
+    """Return a snapshot of count/errors/sum/max/avg per operation."""
+    with _lock:
+        snapshot = {name: dict(metric, buckets=list(metric["buckets"])) for name, metric in _metrics.items()}
+    for metric in snapshot.values():
+        metric["avg"] = metric["sum"] / metric["count"] if metric["count"] else 0.0
+    return snapshot
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP study_tracker_operation_seconds Time spent in instrumented operations.",
+        "# TYPE study_tracker_operation_seconds histogram",
+    ]
+    metrics = get_metrics()
+    for name, metric in sorted(metrics.items()):
+        for bound, count in zip(BUCKETS, metric["buckets"]):
+            lines.append(f'study_tracker_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {count}')
+        lines.append(f'study_tracker_operation_seconds_bucket{{operation="{name}",le="+Inf"}} {metric["count"]}')
+        lines.append(f'study_tracker_operation_seconds_sum{{operation="{name}"}} {metric["sum"]}')
+        lines.append(f'study_tracker_operation_seconds_count{{operation="{name}"}} {metric["count"]}')
+    lines.append("# HELP study_tracker_operation_errors_total Instrumented operations that raised.")
+    lines.append("# TYPE study_tracker_operation_errors_total counter")
+    for name, metric in sorted(metrics.items()):
+        lines.append(f'study_tracker_operation_errors_total{{operation="{name}"}} {metric["errors"]}')
+    for prefix, source in sorted(_stats_sources.items()):
+        try:
+            stats = source()
+        except Exception:
+            continue
+        for key, value in sorted(stats.items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE study_tracker_{prefix}_{key} gauge")
+                lines.append(f"study_tracker_{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=None):
+    """Serve /metrics from a daemon thread, once per process. No-op without a port."""
+    global _server
+    port = port or METRICS_PORT
+    with _lock:
+        if _server is not None or not port:
+            return
+        _server = ThreadingHTTPServer(("", int(port)), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
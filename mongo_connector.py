@@ -1,10 +1,23 @@
 # mongo_connector.py
 
-from pymongo import MongoClient
+import atexit
+import copy
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo import ASCENDING, MongoClient, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, PyMongoError
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from bson.objectid import ObjectId
 
+from frames import compact_frame
+from instrumentation import register_stats, timed
+import write_behind
+
 # ---- CONFIGURATION ----
 # Replace <password> and <your-cluster> with your actual MongoDB Atlas password and cluster details.
 # If your password has special symbols, URL-encode it (e.g. @ → %40).
@@ -13,113 +26,1458 @@ MONGO_URI = (
     "?retryWrites=true&w=majority&appName=Studytracker"
 )
 DB_NAME = "studytracker_db"
+COLLECTIONS = ("study_records", "exam_records", "study_plans")
+
+# Date field of each collection, stored as a native BSON date
+DATE_FIELDS = {
+    "study_records": "date",
+    "exam_records": "exam_date",
+    "study_plans": "plan_date",
+}
+
+# Every record belongs to one student; all reads and writes are scoped by it
+STUDENT_FIELD = "student_id"
+# Owner given to records written before student_id existed
+DEFAULT_STUDENT_ID = os.environ.get("STUDY_TRACKER_DEFAULT_STUDENT", "priyanshi")
+# Cache names of the cross-student results
+STUDENTS_CACHE = "students"
+CLASS_SUMMARY_CACHE = "class_summary"
+
+# Compound indexes backing the dashboard filters and date sorts. Each is led by
+# student_id so a student's queries only touch that student's index range. The
+# (date, _id) ones give pages their (date desc, _id desc) order by walking the
+# index backwards, so a page never sorts the student's whole history.
+INDEXES = {
+    "study_records": [
+        [("student_id", ASCENDING), ("date", ASCENDING), ("subject", ASCENDING), ("chapter", ASCENDING)],
+        [("student_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)],
+    ],
+    "study_plans": [
+        [("student_id", ASCENDING), ("plan_date", ASCENDING), ("subject", ASCENDING), ("chapter", ASCENDING)],
+        [("student_id", ASCENDING), ("plan_date", ASCENDING), ("_id", ASCENDING)],
+    ],
+    "exam_records": [
+        [("student_id", ASCENDING), ("exam_date", ASCENDING), ("subject", ASCENDING), ("exam_type", ASCENDING)],
+        [("student_id", ASCENDING), ("exam_date", ASCENDING), ("_id", ASCENDING)],
+    ],
+}
+# Indexes from before student_id, dropped by ensure_indexes()
+LEGACY_INDEXES = {
+    "study_records": ["date_1_subject_1_chapter_1"],
+    "study_plans": ["plan_date_1_subject_1_chapter_1"],
+    "exam_records": ["exam_date_1_subject_1_exam_type_1"],
+    "daily_rollups": ["day_1_subject_1_chapter_1"],
+    "exam_rollups": ["day_1_subject_1_exam_type_1"],
+    "deleted_records": ["collection_1__id_1"],
+}
+
+# Connection pool settings. Override through environment variables when deploying.
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "20"))
+MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Daily summaries maintained on every write, see ROLLUP SUMMARIES below
+DAILY_ROLLUPS = "daily_rollups"
+EXAM_ROLLUPS = "exam_rollups"
+ROLLUP_KEYS = {
+    DAILY_ROLLUPS: ["student_id", "day", "subject", "chapter"],
+    EXAM_ROLLUPS: ["student_id", "day", "subject", "exam_type"],
+}
+ROLLUP_COLUMNS = {
+    DAILY_ROLLUPS: ["student_id", "day", "subject", "chapter", "planned_hours", "studied_hours", "plan_count", "study_count"],
+    EXAM_ROLLUPS: ["student_id", "day", "subject", "exam_type", "marks_scored", "maximum_marks", "exam_count"],
+}
+# Source collection -> (rollup, source key fields, {rollup measure: source field, or None to count})
+ROLLUP_SPECS = {
+    "study_records": (DAILY_ROLLUPS, ["student_id", "date", "subject", "chapter"],
+                      {"studied_hours": "hours_studied", "study_count": None}),
+    "study_plans": (DAILY_ROLLUPS, ["student_id", "plan_date", "subject", "chapter"],
+                    {"planned_hours": "planned_hours", "plan_count": None}),
+    "exam_records": (EXAM_ROLLUPS, ["student_id", "exam_date", "subject", "exam_type"],
+                     {"marks_scored": "marks_scored", "maximum_marks": "maximum_marks", "exam_count": None}),
+}
+# Rollup rows with nothing left in them are deleted
+ROLLUP_EMPTY = {
+    DAILY_ROLLUPS: {"plan_count": {"$not": {"$gt": 0}}, "study_count": {"$not": {"$gt": 0}}},
+    EXAM_ROLLUPS: {"exam_count": {"$not": {"$gt": 0}}},
+}
+
+# "off" queries MongoDB on every (uncached) read. "incremental" keeps a local
+# copy of each student's documents per collection and only fetches documents
+# added or deleted since the last sync.
+SYNC_MODE = os.environ.get("STUDY_TRACKER_SYNC_MODE", "off").lower()
+# Deletions are recorded here so incremental sync can drop them locally
+TOMBSTONES = "deleted_records"
+TOMBSTONE_TTL_SECONDS = 30 * 24 * 3600
+# Write-behind inserts are recorded here too: their _ids date from when they
+# were queued, so after an outage they can be older than the sync watermark
+WRITE_FEED = "written_records"
+# Without change streams, sync only sees new _ids, so code that rewrites
+# existing documents (e.g. migrations) bumps the collection's epoch here and
+# local copies are reloaded
+SYNC_EPOCHS = "sync_epochs"
+# Change stream events after which the stream cannot continue
+STREAM_RESET_EVENTS = {"invalidate", "drop", "rename", "dropDatabase"}
+# ObjectIds from different clients are only ordered to the second, so each
+# delta re-reads this much history and de-duplicates by _id
+SYNC_OVERLAP_SECONDS = 5
+
+# "direct" inserts new records before add_* returns. "write_behind" journals
+# them locally and inserts them from a background worker; see write_behind.py.
+WRITE_MODE = os.environ.get("STUDY_TRACKER_WRITE_MODE", "direct").lower()
+DUPLICATE_KEY = 11000
+
+# Read cache settings. A TTL of 0 disables caching.
+CACHE_TTL_SECONDS = float(os.environ.get("STUDY_TRACKER_CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.environ.get("STUDY_TRACKER_CACHE_MAX_ENTRIES", "64"))
+
+# ---- CONNECTION POOL ----
+
+class _PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collect connection pool counters and checkout wait times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {
+                "connections_created": 0,
+                "connections_closed": 0,
+                "connections_in_use": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "checkout_wait_total_ms": 0.0,
+                "checkout_wait_max_ms": 0.0,
+                "pool_cleared": 0,
+            }
+
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _record_wait(self):
+        started = getattr(self._local, "checkout_started", None)
+        if started is None:
+            return
+        self._local.checkout_started = None
+        waited_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats["checkout_wait_total_ms"] += waited_ms
+            self.stats["checkout_wait_max_ms"] = max(self.stats["checkout_wait_max_ms"], waited_ms)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._record_wait()
+        self._incr("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._record_wait()
+        with self._lock:
+            self.stats["checkouts"] += 1
+            self.stats["connections_in_use"] += 1
+
+    def connection_checked_in(self, event):
+        self._incr("connections_in_use", -1)
+
+
+_pool_stats = _PoolStatsListener()
+_client = None
+_client_lock = threading.Lock()
 
 def get_client():
-    """Create and return a MongoDB client."""
-    return MongoClient(MONGO_URI)
+    """Return the shared MongoDB client, creating it on first use.
+
+    MongoClient is thread-safe and maintains its own connection pool, so a
+    single instance is reused by every connector function and Streamlit session.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                with timed("mongo.create_client"):
+                    _client = MongoClient(
+                        MONGO_URI,
+                        maxPoolSize=MAX_POOL_SIZE,
+                        minPoolSize=MIN_POOL_SIZE,
+                        connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                        serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                        socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                        waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+                        event_listeners=[_pool_stats],
+                    )
+    return _client
+
+def close_client():
+    """Close the shared MongoDB client and its pooled connections."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+atexit.register(close_client)
+
+def get_pool_stats():
+    """Return a snapshot of connection pool counters.
+
+    Includes the configured pool size, connections created/closed/in use,
+    checkout count, failures and the total/average/max time spent waiting
+    for a pooled connection.
+    """
+    with _pool_stats._lock:
+        stats = dict(_pool_stats.stats)
+    stats["max_pool_size"] = MAX_POOL_SIZE
+    stats["checkout_wait_avg_ms"] = (
+        stats["checkout_wait_total_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    )
+    return stats
 
 def get_collection(collection_name):
-    """Return a MongoDB collection handle."""
+    """Return a MongoDB collection handle backed by the shared client."""
     client = get_client()
     return client[DB_NAME][collection_name]
 
+# ---- SCHEMA SETUP ----
+
+_db_initialised = False
+_init_lock = threading.Lock()
+
+def ensure_indexes():
+    """Create the compound indexes in INDEXES (a no-op if they already exist)."""
+    for collection_name, names in LEGACY_INDEXES.items():
+        col = get_collection(collection_name)
+        for name in set(names).intersection(col.index_information()):
+            col.drop_index(name)
+    for collection_name, indexes in INDEXES.items():
+        col = get_collection(collection_name)
+        for keys in indexes:
+            col.create_index(keys)
+    for rollup, keys in ROLLUP_KEYS.items():
+        get_collection(rollup).create_index([(key, ASCENDING) for key in keys], unique=True)
+    tombstones = get_collection(TOMBSTONES)
+    tombstones.create_index([("collection", ASCENDING), (STUDENT_FIELD, ASCENDING), ("_id", ASCENDING)])
+    tombstones.create_index("deleted_at", expireAfterSeconds=TOMBSTONE_TTL_SECONDS)
+    feed = get_collection(WRITE_FEED)
+    feed.create_index([("collection", ASCENDING), (STUDENT_FIELD, ASCENDING), ("_id", ASCENDING)])
+    feed.create_index("written_at", expireAfterSeconds=TOMBSTONE_TTL_SECONDS)
+
+def migrate_student_ids():
+    """Give records without an owner to DEFAULT_STUDENT_ID.
+
+    Returns the number of updated documents per collection.
+    """
+    migrated = {}
+    for collection_name in COLLECTIONS:
+        result = get_collection(collection_name).update_many(
+            {STUDENT_FIELD: {"$exists": False}}, {"$set": {STUDENT_FIELD: DEFAULT_STUDENT_ID}}
+        )
+        migrated[collection_name] = result.modified_count
+        if result.modified_count:
+            _records_rewritten(collection_name)
+    return migrated
+
+def migrate_string_dates():
+    """Convert legacy "YYYY-MM-DD" string dates to native datetimes.
+
+    Runs server-side as a pipeline update, so documents never leave the
+    database. Values that cannot be parsed are left untouched. Returns the
+    number of converted documents per collection.
+    """
+    converted = {}
+    for collection_name, field in DATE_FIELDS.items():
+        result = get_collection(collection_name).update_many(
+            {field: {"$type": "string"}},
+            [{"$set": {field: {"$dateFromString": {"dateString": "$" + field, "onError": "$" + field}}}}],
+        )
+        converted[collection_name] = result.modified_count
+        if result.modified_count:
+            _records_rewritten(collection_name)
+    return converted
+
+def init_db():
+    """Create indexes, migrate string dates and build missing rollups once per process."""
+    global _db_initialised
+    if _db_initialised:
+        return
+    with _init_lock:
+        if not _db_initialised:
+            # Rollups are built from existing records the first time they are used
+            existing = set(get_client()[DB_NAME].list_collection_names())
+            ensure_indexes()
+            migrate_string_dates()
+            migrated = migrate_student_ids()
+            if not existing.issuperset(ROLLUP_KEYS) or any(migrated.values()):
+                rebuild_rollups()
+            if WRITE_MODE == "write_behind":
+                # Also flushes anything journaled before a restart
+                _start_write_behind()
+            _db_initialised = True
+
+# ---- READ CACHE ----
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_generations = {name: 0 for name in COLLECTIONS}
+# Cached results derived from more than one collection, keyed by source collection
+_DEPENDENT_CACHES = {
+    "study_records": ("planned_vs_actual", DAILY_ROLLUPS, STUDENTS_CACHE, CLASS_SUMMARY_CACHE),
+    "study_plans": ("planned_vs_actual", DAILY_ROLLUPS, STUDENTS_CACHE, CLASS_SUMMARY_CACHE),
+    "exam_records": (EXAM_ROLLUPS, STUDENTS_CACHE, CLASS_SUMMARY_CACHE),
+    # Both are read from the rollups, which write-behind updates after the insert
+    DAILY_ROLLUPS: (STUDENTS_CACHE, CLASS_SUMMARY_CACHE),
+    EXAM_ROLLUPS: (STUDENTS_CACHE, CLASS_SUMMARY_CACHE),
+}
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def _copy_result(result):
+    """Copy a cached result so callers can modify it; tuples are copied per item."""
+    if isinstance(result, tuple):
+        return tuple(copy.copy(item) for item in result)
+    return copy.copy(result)
+
+def _cached_read(collection_name, key, loader):
+    """Return a copy of the cached result for (collection_name, key).
+
+    On a miss or an expired entry the result is rebuilt with loader(). Entries
+    are evicted least-recently-used once CACHE_MAX_ENTRIES is exceeded. A load
+    that races with a write to the same collection is returned but not cached.
+    """
+    cache_key = (collection_name, key)
+    with _cache_lock:
+        entry = _cache.get(cache_key)
+        if entry is not None and entry[0] > time.monotonic():
+            _cache.move_to_end(cache_key)
+            _cache_stats["hits"] += 1
+            return _copy_result(entry[1])
+        _cache_stats["misses"] += 1
+        generation = _cache_generations.setdefault(collection_name, 0)
+
+    result = loader()
+    if CACHE_TTL_SECONDS <= 0:
+        return result
+
+    with _cache_lock:
+        if _cache_generations.get(collection_name, 0) == generation:
+            _cache[cache_key] = (time.monotonic() + CACHE_TTL_SECONDS, result)
+            _cache.move_to_end(cache_key)
+            while len(_cache) > CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+                _cache_stats["evictions"] += 1
+    return _copy_result(result)
+
+def invalidate_cache(collection_name=None):
+    """Drop cached frames for one collection, or for every collection if None.
+
+    Results derived from the collection (see _DEPENDENT_CACHES) are dropped too.
+    """
+    if collection_name is None:
+        names = None
+    else:
+        names = [collection_name, *_DEPENDENT_CACHES.get(collection_name, ())]
+    with _cache_lock:
+        for cache_key in list(_cache):
+            if names is None or cache_key[0] in names:
+                del _cache[cache_key]
+        if names is None:
+            names = list(_cache_generations)
+        for name in names:
+            _cache_generations[name] = _cache_generations.get(name, 0) + 1
+        _cache_stats["invalidations"] += 1
+
+def get_cache_stats():
+    """Return cache hit/miss/eviction/invalidation counters and the current size."""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["entries"] = len(_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+# ---- QUERY HELPERS ----
+
+def _to_datetime(value):
+    """Normalise a date, datetime or ISO date string to a datetime."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+def _build_query(date_field, student_id, start_date=None, end_date=None, **in_filters):
+    """Translate dashboard filters into a MongoDB query document for one student.
+
+    Each keyword in in_filters maps a field to the list of accepted values;
+    empty or None lists are ignored. Both dates are inclusive calendar days.
+    """
+    query = {STUDENT_FIELD: student_id}
+    for field, values in in_filters.items():
+        if values:
+            query[field] = {"$in": list(values)}
+    date_range = {}
+    if start_date:
+        date_range["$gte"] = _to_datetime(start_date)
+    if end_date:
+        date_range["$lt"] = _to_datetime(end_date) + timedelta(days=1)
+    if date_range:
+        query[date_field] = date_range
+    return query
+
+def _cache_key(query, fields):
+    """Build a hashable cache key from a query document and field list."""
+    return (repr(sorted(query.items())), tuple(fields) if fields else None)
+
+def _projection(fields):
+    return {field: 1 for field in fields} if fields else None
+
+def _to_frame(docs, fields=None):
+    """Build a compact typed DataFrame (see frames.py) from documents.
+
+    When fields is given the frame always has those columns (plus _id),
+    even if docs is empty.
+    """
+    if fields:
+        df = pd.DataFrame(docs, columns=["_id", *fields])
+    else:
+        df = pd.DataFrame(docs)
+    return compact_frame(df)
+
+# Python type of each field for columnar decoding; other fields are strings
+ARROW_TYPES = {
+    "date": datetime, "exam_date": datetime, "plan_date": datetime, "created_at": datetime,
+    "hours_studied": float, "planned_hours": float, "maximum_marks": int, "marks_scored": int,
+}
+
+_arrow = None
+
+def _arrow_api():
+    """Return (Schema, find_arrow_all) from pymongoarrow, or None if it is not installed."""
+    global _arrow
+    if _arrow is None:
+        try:
+            from pymongoarrow.api import Schema, find_arrow_all
+            _arrow = (Schema, find_arrow_all)
+        except ImportError:
+            _arrow = False
+    return _arrow or None
+
+def _find_arrow(arrow, col, query, fields):
+    """Decode matching documents straight from BSON into Arrow columns, then a compact frame."""
+    Schema, find_arrow_all = arrow
+    schema = Schema({"_id": ObjectId, **{field: ARROW_TYPES.get(field, str) for field in fields}})
+    table = find_arrow_all(col, query, schema=schema)
+    # ObjectIds arrive as 12-byte binaries
+    ids = [value.hex() for value in table.column("_id").combine_chunks().storage.to_pylist()]
+    df = table.drop_columns(["_id"]).to_pandas()
+    df.insert(0, "_id", ids)
+    return compact_frame(df)
+
+def _load_frame(collection_name, query=None, fields=None):
+    """Fetch matching documents into a DataFrame; only fields are sent by the server.
+
+    With pymongoarrow installed, projected reads skip the per-document dicts.
+    """
+    col = get_collection(collection_name)
+    arrow = _arrow_api() if fields else None
+    if arrow is not None:
+        with timed("mongo.find_arrow"):
+            return _find_arrow(arrow, col, query or {}, fields)
+    with timed("mongo.find"):
+        docs = list(col.find(query or {}, _projection(fields)))
+    with timed("mongo.build_frame"):
+        return _to_frame(docs, fields)
+
+def _read_frame(collection_name, query, fields):
+    if SYNC_MODE == "incremental":
+        df = _filter_frame(sync_collection(collection_name, query[STUDENT_FIELD]), query)
+        return _select_fields(df, fields).reset_index(drop=True)
+    return _cached_read(
+        collection_name,
+        _cache_key(query, fields),
+        lambda: _load_frame(collection_name, query, fields),
+    )
+
+def _keyset_query(query, date_field, after):
+    """Restrict query to documents after the (date, id) cursor in descending order."""
+    if after is None:
+        return query
+    after_date, after_id = after
+    after_id = ObjectId(after_id)
+    keyset = {"$or": [
+        {date_field: {"$lt": after_date}},
+        {date_field: after_date, "_id": {"$lt": after_id}},
+    ]}
+    return {"$and": [query, keyset]} if query else keyset
+
+def _load_page(collection_name, query, fields, page_size, after):
+    """Fetch one page of documents, newest first, using keyset pagination.
+
+    Returns (frame, next_cursor); next_cursor is None on the last page.
+    """
+    date_field = DATE_FIELDS[collection_name]
+    cursor = (
+        get_collection(collection_name)
+        .find(_keyset_query(query, date_field, after), _projection(fields))
+        .sort([(date_field, -1), ("_id", -1)])
+        .limit(page_size + 1)
+    )
+    with timed("mongo.find_page"):
+        docs = list(cursor)
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = (docs[-1].get(date_field), str(docs[-1]["_id"]))
+    with timed("mongo.build_frame"):
+        return _to_frame(docs, fields), next_cursor
+
+def _read_page(collection_name, query, fields, page_size, after):
+    if SYNC_MODE == "incremental":
+        return _local_page(collection_name, query, fields, page_size, after)
+    return _cached_read(
+        collection_name,
+        ("page", _cache_key(query, fields), page_size, after),
+        lambda: _load_page(collection_name, query, fields, page_size, after),
+    )
+
+def iter_record_batches(student_id, collection_name, batch_size=1000, fields=None):
+    """Yield a student's documents of a collection as lists of at most batch_size dicts.
+
+    Batches are pulled from a single server cursor, so only one batch is held
+    in memory at a time. IDs are converted to strings.
+    """
+    cursor = get_collection(collection_name).find(
+        {STUDENT_FIELD: student_id}, _projection(fields), batch_size=batch_size
+    )
+    batch = []
+    for doc in cursor:
+        doc["_id"] = str(doc["_id"])
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _load_distinct(collection_name, field, query):
+    with timed("mongo.distinct"):
+        values = get_collection(collection_name).distinct(field, query)
+    return sorted(value for value in values if value is not None)
+
+def get_distinct_values(student_id, collection_name, field):
+    """Return the sorted distinct values of field for a student, e.g. for filter options."""
+    query = {STUDENT_FIELD: student_id}
+    if SYNC_MODE == "incremental":
+        df = sync_collection(collection_name, student_id)
+        return sorted(df[field].dropna().unique()) if field in df else []
+    return _cached_read(
+        collection_name,
+        ("distinct", student_id, field),
+        lambda: _load_distinct(collection_name, field, query),
+    )
+
+def get_students():
+    """Return the sorted IDs of all students with records, from the small rollups."""
+    return _cached_read(
+        STUDENTS_CACHE,
+        ("students",),
+        lambda: sorted(set().union(*(_load_distinct(rollup, STUDENT_FIELD, {}) for rollup in ROLLUP_KEYS))),
+    )
+
+# ---- INCREMENTAL SYNC ----
+
+# Keyed by (collection, student_id), so a sync only fetches that student's documents
+_sync_state = {}
+# One lock per key, so syncing one never waits on another's fetch
+_sync_locks = {}
+_sync_locks_lock = threading.Lock()
+_change_streams_supported = None
+
+def _supports_change_streams():
+    """Change streams need a replica set or sharded cluster (e.g. Atlas)."""
+    global _change_streams_supported
+    if _change_streams_supported is None:
+        try:
+            hello = get_client().admin.command("hello")
+            _change_streams_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            # Servers or stand-ins that cannot answer hello fall back to tombstones
+            _change_streams_supported = False
+    return _change_streams_supported
+
+def _sync_lock(key):
+    with _sync_locks_lock:
+        return _sync_locks.setdefault(key, threading.Lock())
+
+def _sync_epoch(collection_name):
+    epoch = get_collection(SYNC_EPOCHS).find_one({"_id": collection_name})
+    return epoch["epoch"] if epoch else 0
+
+def _records_rewritten(collection_name):
+    """Invalidate caches and local copies after existing documents were updated in place."""
+    get_collection(SYNC_EPOCHS).update_one({"_id": collection_name}, {"$inc": {"epoch": 1}}, upsert=True)
+    for key in [key for key in _sync_state if key[0] == collection_name]:
+        _sync_state.pop(key, None)
+    invalidate_cache(collection_name)
+
+def _write_tombstones(collection_name, docs):
+    """Record the IDs of deleted documents so incremental sync can drop them from local copies."""
+    if docs:
+        now = datetime.now()
+        get_collection(TOMBSTONES).insert_many([
+            {"collection": collection_name, "record_id": doc["_id"], STUDENT_FIELD: doc.get(STUDENT_FIELD),
+             "deleted_at": now}
+            for doc in docs
+        ])
+
+def _write_feed(collection_name, docs):
+    """Record IDs written by the write-behind worker so incremental sync fetches them."""
+    if docs:
+        now = datetime.now()
+        get_collection(WRITE_FEED).insert_many([
+            {"collection": collection_name, "record_id": doc["_id"], STUDENT_FIELD: doc.get(STUDENT_FIELD),
+             "written_at": now}
+            for doc in docs
+        ])
+
+def _watch(col, student_id, **kwargs):
+    """Open a change stream of one student's documents.
+
+    Delete events carry only the _id, so all of them are passed on; dropping
+    an ID that is not in the local copy is a no-op.
+    """
+    pipeline = [{"$match": {"$or": [
+        {"fullDocument." + STUDENT_FIELD: student_id},
+        {"operationType": {"$nin": ["insert", "update", "replace"]}},
+    ]}}]
+    return col.watch(pipeline, full_document="updateLookup", **kwargs)
+
+def _since(watermark):
+    # _ids from SYNC_OVERLAP_SECONDS before the watermark on
+    since = watermark.generation_time - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    return {"$gte": ObjectId.from_datetime(since)}
+
+def _full_sync(collection_name, student_id):
+    """Load a student's documents of a collection and remember where to resume from."""
+    col = get_collection(collection_name)
+    owned = {"collection": collection_name, STUDENT_FIELD: student_id}
+    state = {"resume_token": None, "watermark": None, "tombstone_watermark": None, "feed_watermark": None,
+             "epoch": None}
+    if _supports_change_streams():
+        # Open the stream first so nothing written during the load is missed
+        with _watch(col, student_id) as stream:
+            state["resume_token"] = stream.resume_token
+    else:
+        last_tombstone = get_collection(TOMBSTONES).find_one(owned, {"_id": 1}, sort=[("_id", -1)])
+        state["tombstone_watermark"] = last_tombstone["_id"] if last_tombstone else None
+        last_write = get_collection(WRITE_FEED).find_one(owned, {"_id": 1}, sort=[("_id", -1)])
+        state["feed_watermark"] = last_write["_id"] if last_write else None
+        state["epoch"] = _sync_epoch(collection_name)
+    docs = list(col.find({STUDENT_FIELD: student_id}))
+    if docs:
+        state["watermark"] = max(doc["_id"] for doc in docs)
+    state["frame"] = _to_frame(docs)
+    state["synced_at"] = time.monotonic()
+    return state
+
+def _apply_changes(frame, upserts, deleted_ids):
+    """Return frame with deleted_ids removed and upserted documents replaced/added."""
+    if not upserts and not deleted_ids:
+        return frame
+    changes = _to_frame(upserts)
+    drop = set(deleted_ids) | (set(changes["_id"]) if not changes.empty else set())
+    if drop and not frame.empty:
+        frame = frame[~frame["_id"].isin(drop)]
+    if not changes.empty:
+        # Categories widened by unknown values make concat fall back to object
+        frame = compact_frame(pd.concat([frame, changes], ignore_index=True))
+    return frame.reset_index(drop=True)
+
+def _sync_from_change_stream(collection_name, student_id, state):
+    """Apply the changes since the resume token; returns False if a full sync is needed."""
+    col = get_collection(collection_name)
+    upserts, deleted_ids = {}, set()
+    with _watch(col, student_id, resume_after=state["resume_token"]) as stream:
+        while True:
+            change = stream.try_next()
+            if change is None:
+                break
+            if change["operationType"] in STREAM_RESET_EVENTS:
+                # The collection was dropped or renamed; the stream has ended
+                return False
+            doc_id = str(change["documentKey"]["_id"])
+            if change["operationType"] == "delete" or change.get("fullDocument") is None:
+                upserts.pop(doc_id, None)
+                deleted_ids.add(doc_id)
+            else:
+                deleted_ids.discard(doc_id)
+                upserts[doc_id] = change["fullDocument"]
+        state["resume_token"] = stream.resume_token
+    state["frame"] = _apply_changes(state["frame"], list(upserts.values()), deleted_ids)
+    return True
+
+def _sync_from_watermarks(collection_name, student_id, state):
+    """Apply new documents and tombstones; returns False if a full sync is needed."""
+    if _sync_epoch(collection_name) != state["epoch"]:
+        return False
+    col = get_collection(collection_name)
+    query = {STUDENT_FIELD: student_id}
+    if state["watermark"] is not None:
+        query["_id"] = _since(state["watermark"])
+    new_docs = {doc["_id"]: doc for doc in col.find(query)}
+    if new_docs:
+        newest = max(new_docs)
+        if state["watermark"] is None or newest > state["watermark"]:
+            state["watermark"] = newest
+
+    # Write-behind documents stored after newer ones were synced
+    feed_query = {"collection": collection_name, STUDENT_FIELD: student_id}
+    if state["feed_watermark"] is not None:
+        feed_query["_id"] = _since(state["feed_watermark"])
+    written = list(get_collection(WRITE_FEED).find(feed_query, {"record_id": 1}))
+    if written:
+        newest = max(entry["_id"] for entry in written)
+        if state["feed_watermark"] is None or newest > state["feed_watermark"]:
+            state["feed_watermark"] = newest
+        late_ids = {entry["record_id"] for entry in written}.difference(new_docs)
+        if late_ids:
+            new_docs.update((doc["_id"], doc) for doc in col.find({"_id": {"$in": list(late_ids)}}))
+
+    tombstone_query = {"collection": collection_name, STUDENT_FIELD: student_id}
+    if state["tombstone_watermark"] is not None:
+        tombstone_query["_id"] = {"$gt": state["tombstone_watermark"]}
+    tombstones = list(get_collection(TOMBSTONES).find(tombstone_query, {"record_id": 1}).sort("_id", ASCENDING))
+    if tombstones:
+        state["tombstone_watermark"] = tombstones[-1]["_id"]
+    deleted_ids = {str(tombstone["record_id"]) for tombstone in tombstones}
+
+    state["frame"] = _apply_changes(
+        state["frame"], [doc for doc in new_docs.values() if str(doc["_id"]) not in deleted_ids], deleted_ids
+    )
+    return True
+
+def sync_collection(collection_name, student_id):
+    """Bring the local copy of a student's documents of a collection up to date and return it.
+
+    The frame is shared with later syncs: filter it (which copies) rather
+    than modifying it. The first call loads all of the student's documents.
+    Later calls only fetch the delta: from a change stream when the server supports it, otherwise
+    documents whose _id is newer than the last watermark plus tombstones
+    written by the delete functions; documents updated in place are only
+    seen there after _records_rewritten() bumps the collection's epoch.
+    Falls back to a full reload if the change stream cannot resume or was
+    invalidated, the epoch changed or tombstones may have expired.
+    """
+    key = (collection_name, student_id)
+    with _sync_lock(key), timed("mongo.sync"):
+        state = _sync_state.get(key)
+        expired = state is not None and time.monotonic() - state["synced_at"] > TOMBSTONE_TTL_SECONDS / 2
+        if state is None or expired:
+            state = _full_sync(collection_name, student_id)
+        else:
+            try:
+                if state["resume_token"] is not None:
+                    synced = _sync_from_change_stream(collection_name, student_id, state)
+                else:
+                    synced = _sync_from_watermarks(collection_name, student_id, state)
+                state["synced_at"] = time.monotonic()
+            except PyMongoError:
+                synced = False
+            if not synced:
+                state = _full_sync(collection_name, student_id)
+        _sync_state[key] = state
+        return state["frame"]
+
+def _filter_frame(df, query):
+    """Apply a query built by _build_query ($in and date ranges) to a local frame."""
+    mask = pd.Series(True, index=df.index)
+    for field, condition in query.items():
+        if field not in df:
+            return df.iloc[0:0]
+        column = df[field]
+        if not isinstance(condition, dict):
+            mask &= column == condition
+            continue
+        if "$in" in condition:
+            mask &= column.isin(condition["$in"])
+        if "$gte" in condition:
+            mask &= column >= condition["$gte"]
+        if "$lt" in condition:
+            mask &= column < condition["$lt"]
+    return df[mask]
+
+def _select_fields(df, fields):
+    return df.reindex(columns=["_id", *fields]) if fields else df
+
+def _local_page(collection_name, query, fields, page_size, after):
+    date_field = DATE_FIELDS[collection_name]
+    df = _filter_frame(sync_collection(collection_name, query[STUDENT_FIELD]), query)
+    if df.empty:
+        return _select_fields(df, fields).reset_index(drop=True), None
+    if after is not None:
+        after_date, after_id = pd.Timestamp(after[0]), after[1]
+        df = df[(df[date_field] < after_date) | ((df[date_field] == after_date) & (df["_id"] < after_id))]
+    # Hex ObjectId strings sort in the same order as the ObjectIds
+    df = df.sort_values([date_field, "_id"], ascending=False).head(page_size + 1)
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        next_cursor = (df[date_field].iloc[-1], df["_id"].iloc[-1])
+    return _select_fields(df, fields).reset_index(drop=True), next_cursor
+
+def _local_planned_vs_actual(plan_query, study_query):
+    plans = _filter_frame(sync_collection("study_plans", plan_query[STUDENT_FIELD]), plan_query)
+    studies = _filter_frame(sync_collection("study_records", study_query[STUDENT_FIELD]), study_query)
+    keys = ["date", "subject", "chapter"]
+    combined = pd.concat([
+        plans.rename(columns={"plan_date": "date"}).reindex(columns=[*keys, "planned_hours"]),
+        studies.reindex(columns=[*keys, "hours_studied"]),
+    ], ignore_index=True).fillna({"planned_hours": 0, "hours_studied": 0})
+    if combined.empty:
+        return pd.DataFrame(columns=PLANNED_VS_ACTUAL_COLUMNS)
+    totals = combined.groupby(keys, as_index=False, observed=True)[["planned_hours", "hours_studied"]].sum()
+    totals = totals.sort_values(["date", "subject", "chapter"], ascending=[False, True, True])
+    return totals[PLANNED_VS_ACTUAL_COLUMNS].reset_index(drop=True)
+
+# ---- WRITES ----
+
+def _insert_new(collection_name, doc):
+    """Insert a document from an add_* call, or journal it in write-behind mode."""
+    if WRITE_MODE == "write_behind":
+        doc["_id"] = ObjectId()
+        _start_write_behind()
+        write_behind.enqueue(collection_name, doc)
+        return
+    get_collection(collection_name).insert_one(doc)
+    _update_rollups(collection_name, [doc])
+    invalidate_cache(collection_name)
+
+def _start_write_behind():
+    write_behind.start(write_documents, count_documents, remove_documents)
+
+def write_documents(collection_name, docs):
+    """Insert documents that already carry their _id, for the write-behind worker.
+
+    Documents whose _id is already stored were written by an earlier attempt
+    and count as written; the rollups are updated separately by
+    count_documents(). Returns [(_id, message)] for documents that failed.
+    """
+    errors = {}
+    try:
+        get_collection(collection_name).insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+    finally:
+        invalidate_cache(collection_name)
+    stored = [
+        doc for position, doc in enumerate(docs)
+        if position not in errors or errors[position].get("code") == DUPLICATE_KEY
+    ]
+    _write_feed(collection_name, stored)
+    return [
+        (str(docs[position]["_id"]), error.get("errmsg", "Write error"))
+        for position, error in errors.items() if error.get("code") != DUPLICATE_KEY
+    ]
+
+def count_documents(collection_name, docs, recount=False):
+    """Add documents stored by write_documents() to the rollups, for the write-behind worker.
+
+    With recount, an earlier attempt may have been applied without a reply,
+    so the documents' rollup rows are recounted from the records instead.
+    """
+    if recount:
+        _recount_rollups(collection_name, docs)
+    else:
+        _update_rollups(collection_name, docs)
+
+def remove_documents(collection_name, docs, recount=False):
+    """Delete written documents that were discarded during their write, for the write-behind worker."""
+    ids = [doc["_id"] for doc in docs]
+    with timed("mongo.delete_many"):
+        deleted = get_collection(collection_name).delete_many({"_id": {"$in": ids}}).deleted_count
+    if recount or deleted != len(docs):
+        # An earlier attempt deleted some of them, and may have counted them out
+        _recount_rollups(collection_name, docs)
+    else:
+        _update_rollups(collection_name, docs, sign=-1)
+    _write_tombstones(collection_name, docs)
+    invalidate_cache(collection_name)
+
+def get_pending_writes(student_id, collection_name, fields=None):
+    """Return a student's journaled documents of a collection not yet written to MongoDB."""
+    if WRITE_MODE != "write_behind":
+        return _to_frame([], fields)
+    return _to_frame(write_behind.get_pending(collection_name, student_id), fields)
+
 # ---- STUDY RECORDS ----
 
-def add_study_record(date, subject, chapter, book_material, hours_studied, remarks):
-    col = get_collection("study_records")
-    col.insert_one({
-        "date": str(date),
+def add_study_record(student_id, date, subject, chapter, book_material, hours_studied, remarks):
+    doc = {
+        "student_id": student_id,
+        "date": _to_datetime(date),
         "subject": subject,
         "chapter": chapter,
         "book_material": book_material,
         "hours_studied": hours_studied,
         "remarks": remarks,
         "created_at": datetime.now()
-    })
+    }
+    _insert_new("study_records", doc)
 
-def get_study_records():
-    col = get_collection("study_records")
-    df = pd.DataFrame(list(col.find()))
-    if not df.empty and "_id" in df:
-        df["_id"] = df["_id"].astype(str)
-    return df
+def _study_query(student_id, subjects=None, chapters=None, book_materials=None, start_date=None, end_date=None):
+    return _build_query(
+        "date", student_id, start_date, end_date,
+        subject=subjects, chapter=chapters, book_material=book_materials,
+    )
+
+def get_study_records(student_id, subjects=None, chapters=None, book_materials=None,
+                      start_date=None, end_date=None, fields=None):
+    query = _study_query(student_id, subjects, chapters, book_materials, start_date, end_date)
+    return _read_frame("study_records", query, fields)
+
+def get_study_records_page(student_id, subjects=None, chapters=None, book_materials=None,
+                           start_date=None, end_date=None, fields=None,
+                           page_size=50, after=None):
+    """Return (frame, next_cursor) for one page of study records, newest first.
 
-def delete_study_record(record_id):
+    Pass the returned cursor as after to fetch the following page.
+    """
+    query = _study_query(student_id, subjects, chapters, book_materials, start_date, end_date)
+    return _read_page("study_records", query, fields, page_size, after)
+
+def delete_study_record(student_id, record_id):
     col = get_collection("study_records")
     try:
         obj_id = ObjectId(record_id)
     except Exception:
         raise ValueError("Invalid Study Record ID format.")
-    result = col.delete_one({"_id": obj_id})
-    if result.deleted_count == 0:
+    doc = col.find_one_and_delete({"_id": obj_id, STUDENT_FIELD: student_id})
+    if doc is None:
+        if WRITE_MODE == "write_behind" and write_behind.discard(obj_id, student_id):
+            return
         raise ValueError("Study record ID not found.")
+    _update_rollups("study_records", [doc], sign=-1)
+    _write_tombstones("study_records", [doc])
+    invalidate_cache("study_records")
+
+def delete_study_records(student_id, record_ids=None, subjects=None, chapters=None, book_materials=None,
+                         start_date=None, end_date=None, dry_run=False):
+    """Delete the study records with record_ids and/or matching the filters.
+
+    Returns the number deleted, or with dry_run the number that would be.
+    """
+    _check_delete_criteria(record_ids, subjects, chapters, book_materials, start_date, end_date)
+    query = _study_query(student_id, subjects, chapters, book_materials, start_date, end_date)
+    return _delete_many("study_records", student_id, query, record_ids, "Study Record", dry_run)
 
 # ---- EXAM RECORDS ----
 
-def add_exam_record(exam_date, subject, exam_type, maximum_marks, marks_scored, improvements):
-    col = get_collection("exam_records")
-    col.insert_one({
-        "exam_date": str(exam_date),
+def add_exam_record(student_id, exam_date, subject, exam_type, maximum_marks, marks_scored, improvements):
+    doc = {
+        "student_id": student_id,
+        "exam_date": _to_datetime(exam_date),
         "subject": subject,
         "exam_type": exam_type,
         "maximum_marks": maximum_marks,
         "marks_scored": marks_scored,
         "improvements": improvements,
         "created_at": datetime.now()
-    })
+    }
+    _insert_new("exam_records", doc)
 
-def get_exam_records():
-    col = get_collection("exam_records")
-    df = pd.DataFrame(list(col.find()))
-    if not df.empty and "_id" in df:
-        df["_id"] = df["_id"].astype(str)
-    return df
+def _exam_query(student_id, subjects=None, exam_types=None, start_date=None, end_date=None):
+    return _build_query("exam_date", student_id, start_date, end_date, subject=subjects, exam_type=exam_types)
 
-def delete_exam_record(record_id):
+def get_exam_records(student_id, subjects=None, exam_types=None, start_date=None, end_date=None, fields=None):
+    query = _exam_query(student_id, subjects, exam_types, start_date, end_date)
+    return _read_frame("exam_records", query, fields)
+
+def get_exam_records_page(student_id, subjects=None, exam_types=None, start_date=None, end_date=None,
+                          fields=None, page_size=50, after=None):
+    """Return (frame, next_cursor) for one page of exam records, newest first."""
+    query = _exam_query(student_id, subjects, exam_types, start_date, end_date)
+    return _read_page("exam_records", query, fields, page_size, after)
+
+def delete_exam_record(student_id, record_id):
     col = get_collection("exam_records")
     try:
         obj_id = ObjectId(record_id)
     except Exception:
         raise ValueError("Invalid Exam Record ID format.")
-    result = col.delete_one({"_id": obj_id})
-    if result.deleted_count == 0:
+    doc = col.find_one_and_delete({"_id": obj_id, STUDENT_FIELD: student_id})
+    if doc is None:
+        if WRITE_MODE == "write_behind" and write_behind.discard(obj_id, student_id):
+            return
         raise ValueError("Exam record ID not found.")
+    _update_rollups("exam_records", [doc], sign=-1)
+    _write_tombstones("exam_records", [doc])
+    invalidate_cache("exam_records")
+
+def delete_exam_records(student_id, record_ids=None, subjects=None, exam_types=None,
+                        start_date=None, end_date=None, dry_run=False):
+    """Delete the exam records with record_ids and/or matching the filters.
+
+    Returns the number deleted, or with dry_run the number that would be.
+    """
+    _check_delete_criteria(record_ids, subjects, exam_types, start_date, end_date)
+    query = _exam_query(student_id, subjects, exam_types, start_date, end_date)
+    return _delete_many("exam_records", student_id, query, record_ids, "Exam Record", dry_run)
 
 # ---- STUDY PLANS ----
 
-def add_study_plan(plan_date, subject, chapter, planned_hours, remarks):
-    col = get_collection("study_plans")
-    col.insert_one({
-        "plan_date": str(plan_date),
+def add_study_plan(student_id, plan_date, subject, chapter, planned_hours, remarks):
+    doc = {
+        "student_id": student_id,
+        "plan_date": _to_datetime(plan_date),
         "subject": subject,
         "chapter": chapter,
         "planned_hours": planned_hours,
         "remarks": remarks,
         "created_at": datetime.now()
-    })
+    }
+    _insert_new("study_plans", doc)
 
-def get_study_plans():
-    col = get_collection("study_plans")
-    df = pd.DataFrame(list(col.find()))
-    if not df.empty and "_id" in df:
-        df["_id"] = df["_id"].astype(str)
-    return df
+def _plan_query(student_id, subjects=None, chapters=None, start_date=None, end_date=None):
+    return _build_query("plan_date", student_id, start_date, end_date, subject=subjects, chapter=chapters)
+
+def get_study_plans(student_id, subjects=None, chapters=None, start_date=None, end_date=None, fields=None):
+    query = _plan_query(student_id, subjects, chapters, start_date, end_date)
+    return _read_frame("study_plans", query, fields)
+
+def get_study_plans_page(student_id, subjects=None, chapters=None, start_date=None, end_date=None,
+                         fields=None, page_size=50, after=None):
+    """Return (frame, next_cursor) for one page of study plans, newest first."""
+    query = _plan_query(student_id, subjects, chapters, start_date, end_date)
+    return _read_page("study_plans", query, fields, page_size, after)
 
-def delete_study_plan(record_id):
+def delete_study_plan(student_id, record_id):
     col = get_collection("study_plans")
     try:
         obj_id = ObjectId(record_id)
     except Exception:
         raise ValueError("Invalid Study Plan Record ID format.")
-    result = col.delete_one({"_id": obj_id})
-    if result.deleted_count == 0:
+    doc = col.find_one_and_delete({"_id": obj_id, STUDENT_FIELD: student_id})
+    if doc is None:
+        if WRITE_MODE == "write_behind" and write_behind.discard(obj_id, student_id):
+            return
         raise ValueError("Study plan record ID not found.")
+    _update_rollups("study_plans", [doc], sign=-1)
+    _write_tombstones("study_plans", [doc])
+    invalidate_cache("study_plans")
+
+def delete_study_plans(student_id, record_ids=None, subjects=None, chapters=None,
+                       start_date=None, end_date=None, dry_run=False):
+    """Delete the study plans with record_ids and/or matching the filters.
+
+    Returns the number deleted, or with dry_run the number that would be.
+    """
+    _check_delete_criteria(record_ids, subjects, chapters, start_date, end_date)
+    query = _plan_query(student_id, subjects, chapters, start_date, end_date)
+    return _delete_many("study_plans", student_id, query, record_ids, "Study Plan Record", dry_run)
+
+# ---- BULK WRITES ----
+
+def _check_delete_criteria(record_ids, *filters):
+    # A bulk delete without IDs or filters would remove all of a student's records
+    if not record_ids and not any(filters):
+        raise ValueError("Select records or set a filter to delete.")
+
+def _delete_many(collection_name, student_id, query, record_ids, label, dry_run):
+    """Delete the documents matching query (and record_ids, if given) with one delete_many.
+
+    Only the fields the rollups need are read first, so the rollups can be
+    decremented and tombstones written for exactly the deleted documents.
+    Journaled write-behind documents among record_ids are discarded too.
+    """
+    if record_ids:
+        try:
+            obj_ids = [ObjectId(record_id) for record_id in record_ids]
+        except Exception:
+            raise ValueError(f"Invalid {label} ID format.")
+        query = {**query, "_id": {"$in": obj_ids}}
+    col = get_collection(collection_name)
+    if dry_run:
+        with timed("mongo.count"):
+            count = col.count_documents(query)
+        if WRITE_MODE == "write_behind" and record_ids:
+            pending = {str(doc["_id"]) for doc in write_behind.get_pending(collection_name, student_id)}
+            count += len(pending.intersection(map(str, obj_ids)))
+        return count
+
+    _, key_fields, measures = ROLLUP_SPECS[collection_name]
+    projection = dict.fromkeys([*key_fields, *filter(None, measures.values())], 1)
+    with timed("mongo.find"):
+        docs = list(col.find(query, projection))
+    deleted = 0
+    if docs:
+        ids = [doc["_id"] for doc in docs]
+        with timed("mongo.delete_many"):
+            deleted = col.delete_many({"_id": {"$in": ids}, STUDENT_FIELD: student_id}).deleted_count
+        if deleted == len(docs):
+            _update_rollups(collection_name, docs, sign=-1)
+        else:
+            # Some were deleted concurrently, e.g. by a second click, and are
+            # counted out by that call; this student's affected rows are recounted
+            _recount_rollups(collection_name, docs)
+        _write_tombstones(collection_name, docs)
+        invalidate_cache(collection_name)
+    if WRITE_MODE == "write_behind" and record_ids:
+        found = {doc["_id"] for doc in docs}
+        deleted += sum(write_behind.discard(obj_id, student_id) for obj_id in obj_ids if obj_id not in found)
+    return deleted
+
+def insert_records(student_id, collection_name, docs):
+    """Insert a student's already-validated documents with one unordered insert_many.
+
+    The date field is converted to a datetime and student_id and created_at
+    are set. Returns
+    (inserted_count, errors) where errors lists (position in docs, message)
+    for documents the server rejected; the rest are still written and
+    counted into the rollups.
+    """
+    if not docs:
+        return 0, []
+    date_field = DATE_FIELDS[collection_name]
+    now = datetime.now()
+    docs = [
+        {**doc, STUDENT_FIELD: student_id, date_field: _to_datetime(doc[date_field]), "created_at": now}
+        for doc in docs
+    ]
+    errors = []
+    try:
+        get_collection(collection_name).insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = [(error["index"], error.get("errmsg", "Write error")) for error in e.details.get("writeErrors", [])]
+    finally:
+        invalidate_cache(collection_name)
+    failed = {position for position, _ in errors}
+    inserted = [doc for position, doc in enumerate(docs) if position not in failed]
+    _update_rollups(collection_name, inserted)
+    return len(inserted), errors
+
+# ---- ROLLUP SUMMARIES ----
+
+# Whether the client accepts bulk_write of UpdateOne; None until first tried
+_bulk_updates_supported = None
+
+def _rollup_deltas(collection_name, docs, sign=1):
+    """Sum the rollup measures of docs per rollup key."""
+    rollup, key_fields, measures = ROLLUP_SPECS[collection_name]
+    deltas = {}
+    for doc in docs:
+        key = tuple(doc.get(field) for field in key_fields)
+        totals = deltas.setdefault(key, dict.fromkeys(measures, 0))
+        for measure, source in measures.items():
+            totals[measure] += sign * ((doc.get(source) or 0) if source else 1)
+    return rollup, deltas
+
+def _upsert_many(col, keys, updates):
+    # One upsert per key, sent as one unordered bulk write
+    global _bulk_updates_supported
+    if len(keys) > 1 and _bulk_updates_supported is not False:
+        try:
+            col.bulk_write([UpdateOne(key, update, upsert=True) for key, update in zip(keys, updates)],
+                           ordered=False)
+            _bulk_updates_supported = True
+            return
+        except TypeError:
+            # Stand-ins such as mongomock reject current UpdateOne arguments
+            # before sending anything; they get one update per key
+            if _bulk_updates_supported:
+                raise
+            _bulk_updates_supported = False
+    for key, update in zip(keys, updates):
+        col.update_one(key, update, upsert=True)
+
+def _update_rollups(collection_name, docs, sign=1):
+    """Apply inserted (sign=1) or deleted (sign=-1) source docs to their rollup with $inc."""
+    rollup, deltas = _rollup_deltas(collection_name, docs, sign)
+    if not deltas:
+        return
+    keys = [dict(zip(ROLLUP_KEYS[rollup], key)) for key in deltas]
+    col = get_collection(rollup)
+    _upsert_many(col, keys, [{"$inc": totals} for totals in deltas.values()])
+    if sign < 0:
+        col.delete_many({"$or": keys, **ROLLUP_EMPTY[rollup]})
+    invalidate_cache(rollup)
+
+def rebuild_rollups():
+    """Regenerate the rollup collections from the raw records.
+
+    Records are grouped on the server; the grouped rows go to a scratch
+    collection that then replaces the rollup in one rename, so readers never
+    see a half-built rollup. In write-behind mode the journal is paused and
+    updated to match, since the rebuild counts documents it has written.
+    """
+    if WRITE_MODE == "write_behind":
+        with write_behind.recounting():
+            return _rebuild_rollups()
+    return _rebuild_rollups()
+
+def _group_rollups(matches):
+    """Group the records matching matches[source collection] into rollup rows, {rollup: {key: row}}."""
+    rows = {}
+    for collection_name, match in matches.items():
+        rollup, key_fields, measures = ROLLUP_SPECS[collection_name]
+        group = {"_id": {key: "$" + field for key, field in zip(ROLLUP_KEYS[rollup], key_fields)}}
+        for measure, source in measures.items():
+            group[measure] = {"$sum": ("$" + source) if source else 1}
+        pipeline = [{"$match": match}, {"$group": group}] if match else [{"$group": group}]
+        for row in get_collection(collection_name).aggregate(pipeline):
+            key = tuple(row["_id"][name] for name in ROLLUP_KEYS[rollup])
+            doc = rows.setdefault(rollup, {}).setdefault(key, {
+                **row["_id"], **{column: 0 for column in ROLLUP_COLUMNS[rollup][len(key):]}
+            })
+            for measure in measures:
+                doc[measure] += row[measure]
+    return rows
+
+def _recount_rollups(collection_name, docs):
+    """Recount the rollup rows docs belong to from the records and $set them.
+
+    For updates that may have been applied twice or not at all, e.g. two
+    deletes of the same records racing. Unlike rebuild_rollups(), only these
+    keys are read and written, so other students' rows and concurrent $inc
+    updates to other keys are left alone.
+    """
+    rollup, deltas = _rollup_deltas(collection_name, docs)
+    if not deltas:
+        return
+    names = ROLLUP_KEYS[rollup]
+    matches = {
+        source: {"$or": [dict(zip(key_fields, key)) for key in deltas]}
+        for source, (target, key_fields, _) in ROLLUP_SPECS.items() if target == rollup
+    }
+    keys = [dict(zip(names, key)) for key in deltas]
+    measures = ROLLUP_COLUMNS[rollup][len(names):]
+
+    def recount():
+        rows = _group_rollups(matches).get(rollup, {})
+        col = get_collection(rollup)
+        _upsert_many(col, keys, [
+            {"$set": {measure: rows.get(key, {}).get(measure, 0) for measure in measures}} for key in deltas
+        ])
+        col.delete_many({"$or": keys, **ROLLUP_EMPTY[rollup]})
+        invalidate_cache(rollup)
+
+    if WRITE_MODE == "write_behind":
+        def affects(source, doc):
+            target, key_fields, _ = ROLLUP_SPECS[source]
+            return target == rollup and tuple(doc.get(field) for field in key_fields) in deltas
+        with write_behind.recounting(affects):
+            recount()
+    else:
+        recount()
+
+def _rebuild_rollups():
+    rows = {rollup: {} for rollup in ROLLUP_KEYS}
+    rows.update(_group_rollups(dict.fromkeys(ROLLUP_SPECS)))
+
+    db = get_client()[DB_NAME]
+    for rollup, docs in rows.items():
+        if not docs:
+            db[rollup].delete_many({})
+        else:
+            scratch = db[rollup + "_rebuild"]
+            scratch.drop()
+            scratch.create_index([(key, ASCENDING) for key in ROLLUP_KEYS[rollup]], unique=True)
+            scratch.insert_many(list(docs.values()), ordered=False)
+            scratch.rename(rollup, dropTarget=True)
+        invalidate_cache(rollup)
+    return {rollup: len(docs) for rollup, docs in rows.items()}
+
+def _load_rollups(rollup, query):
+    with timed("mongo.find_rollups"):
+        docs = list(get_collection(rollup).find(query, {"_id": 0}))
+    return compact_frame(pd.DataFrame(docs, columns=ROLLUP_COLUMNS[rollup]).fillna(0), numeric=False)
+
+def get_daily_rollups(student_id, subjects=None, chapters=None, start_date=None, end_date=None):
+    """Return a student's daily planned/studied hours and counts per (day, subject, chapter)."""
+    query = _build_query("day", student_id, start_date, end_date, subject=subjects, chapter=chapters)
+    return _cached_read(DAILY_ROLLUPS, _cache_key(query, None), lambda: _load_rollups(DAILY_ROLLUPS, query))
+
+def get_exam_rollups(student_id, subjects=None, exam_types=None, start_date=None, end_date=None):
+    """Return a student's daily marks, maximum marks and exam counts per (day, subject, exam_type)."""
+    query = _build_query("day", student_id, start_date, end_date, subject=subjects, exam_type=exam_types)
+    return _cached_read(EXAM_ROLLUPS, _cache_key(query, None), lambda: _load_rollups(EXAM_ROLLUPS, query))
+
+CLASS_SUMMARY_COLUMNS = [
+    "subject", "students", "planned_hours", "studied_hours", "hours_per_student",
+    "exam_students", "exams", "average_percentage",
+]
+
+def _class_match(student_ids, subjects, start_date, end_date):
+    match = {}
+    if student_ids:
+        match[STUDENT_FIELD] = {"$in": list(student_ids)}
+    if subjects:
+        match["subject"] = {"$in": list(subjects)}
+    date_range = {}
+    if start_date:
+        date_range["$gte"] = _to_datetime(start_date)
+    if end_date:
+        date_range["$lt"] = _to_datetime(end_date) + timedelta(days=1)
+    if date_range:
+        match["day"] = date_range
+    return match
+
+def _load_class_summary(match):
+    # Rollups are summed per (subject, student) first, then per subject, so
+    # only one row per subject leaves the server
+    hours = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"subject": "$subject", "student": "$" + STUDENT_FIELD},
+            "planned_hours": {"$sum": "$planned_hours"},
+            "studied_hours": {"$sum": "$studied_hours"},
+        }},
+        {"$group": {
+            "_id": "$_id.subject",
+            "students": {"$sum": 1},
+            "planned_hours": {"$sum": "$planned_hours"},
+            "studied_hours": {"$sum": "$studied_hours"},
+        }},
+    ]
+    exams = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"subject": "$subject", "student": "$" + STUDENT_FIELD},
+            "marks_scored": {"$sum": "$marks_scored"},
+            "maximum_marks": {"$sum": "$maximum_marks"},
+            "exam_count": {"$sum": "$exam_count"},
+        }},
+        {"$group": {
+            "_id": "$_id.subject",
+            "exam_students": {"$sum": 1},
+            "exams": {"$sum": "$exam_count"},
+            # Each student's percentage counts once, however many exams they sat
+            "average_percentage": {"$avg": {"$cond": [
+                {"$gt": ["$maximum_marks", 0]},
+                {"$multiply": [{"$divide": ["$marks_scored", "$maximum_marks"]}, 100]},
+                None,
+            ]}},
+        }},
+    ]
+    with timed("mongo.aggregate"):
+        rows = {}
+        for row in get_collection(DAILY_ROLLUPS).aggregate(hours):
+            rows.setdefault(row.pop("_id"), {}).update(row)
+        for row in get_collection(EXAM_ROLLUPS).aggregate(exams):
+            rows.setdefault(row.pop("_id"), {}).update(row)
+    df = pd.DataFrame(
+        [{"subject": subject, **totals} for subject, totals in rows.items()],
+        columns=CLASS_SUMMARY_COLUMNS,
+    )
+    df = df.fillna({"students": 0, "planned_hours": 0, "studied_hours": 0, "exam_students": 0, "exams": 0})
+    df["hours_per_student"] = df["studied_hours"] / df["students"].where(df["students"] > 0)
+    return compact_frame(df.sort_values("subject").reset_index(drop=True), numeric=False)
+
+def get_class_summary(student_ids=None, subjects=None, start_date=None, end_date=None):
+    """Return class-level totals per subject across students.
+
+    Hours come from the daily rollups and marks from the exam rollups, both
+    grouped on the server. student_ids narrows the class; None means every
+    student. average_percentage is the mean of the students' percentages.
+    """
+    match = _class_match(student_ids, subjects, start_date, end_date)
+    return _cached_read(CLASS_SUMMARY_CACHE, _cache_key(match, None), lambda: _load_class_summary(match))
+
+# ---- AGGREGATES ----
+
+PLANNED_VS_ACTUAL_COLUMNS = ["date", "subject", "chapter", "planned_hours", "hours_studied"]
+
+def _load_planned_vs_actual(plan_query, study_query):
+    pipeline = [
+        {"$match": plan_query},
+        {"$group": {
+            "_id": {"date": "$plan_date", "subject": "$subject", "chapter": "$chapter"},
+            "planned_hours": {"$sum": "$planned_hours"},
+            "hours_studied": {"$sum": 0},
+        }},
+        {"$unionWith": {"coll": "study_records", "pipeline": [
+            {"$match": study_query},
+            {"$group": {
+                "_id": {"date": "$date", "subject": "$subject", "chapter": "$chapter"},
+                "planned_hours": {"$sum": 0},
+                "hours_studied": {"$sum": "$hours_studied"},
+            }},
+        ]}},
+        {"$group": {
+            "_id": "$_id",
+            "planned_hours": {"$sum": "$planned_hours"},
+            "hours_studied": {"$sum": "$hours_studied"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date",
+            "subject": "$_id.subject",
+            "chapter": "$_id.chapter",
+            "planned_hours": 1,
+            "hours_studied": 1,
+        }},
+        {"$sort": {"date": -1, "subject": 1, "chapter": 1}},
+    ]
+    with timed("mongo.aggregate"):
+        rows = list(get_collection("study_plans").aggregate(pipeline))
+    return compact_frame(pd.DataFrame(rows, columns=PLANNED_VS_ACTUAL_COLUMNS))
+
+def get_planned_vs_actual(student_id, subjects=None, chapters=None, book_materials=None,
+                          start_date=None, end_date=None):
+    """Return planned and actual study hours per (date, subject, chapter).
+
+    Both collections are grouped on the server and combined with $unionWith,
+    so only the aggregated rows are transferred. book_materials only narrows
+    the study records, since plans have no material.
+    """
+    plan_query = _build_query("plan_date", student_id, start_date, end_date, subject=subjects, chapter=chapters)
+    study_query = _study_query(student_id, subjects, chapters, book_materials, start_date, end_date)
+    if SYNC_MODE == "incremental":
+        return _local_planned_vs_actual(plan_query, study_query)
+    return _cached_read(
+        "planned_vs_actual",
+        (_cache_key(plan_query, None), _cache_key(study_query, None)),
+        lambda: _load_planned_vs_actual(plan_query, study_query),
+    )
+
+register_stats("mongo_pool", get_pool_stats)
+register_stats("mongo_cache", get_cache_stats)
 
 # ---- Optional: Test connection snippet ----
 if __name__ == "__main__":
+    if sys.argv[1:] == ["rebuild-rollups"]:
+        print("Rebuilt rollups:", rebuild_rollups())
+        sys.exit()
     try:
         client = get_client()
         client.server_info()  # Verify connection
         print("✅ MongoDB connection successful!")
+        print("Pool stats:", get_pool_stats())
     except Exception as e:
         print("❌ MongoDB connection failed:", e)
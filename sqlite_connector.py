@@ -0,0 +1,686 @@
+# sqlite_connector.py
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date, datetime
+
+import pandas as pd
+
+from frames import compact_frame
+
+# ---- CONFIGURATION ----
+SQLITE_PATH = os.environ.get(
+    "STUDY_TRACKER_SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "study_tracker.db"),
+)
+# Compiled statements kept per connection, keyed by SQL text
+CACHED_STATEMENTS = 256
+
+COLLECTIONS = ("study_records", "exam_records", "study_plans")
+
+# Owner given to rows written before student_id existed
+DEFAULT_STUDENT_ID = os.environ.get("STUDY_TRACKER_DEFAULT_STUDENT", "priyanshi")
+
+DATE_FIELDS = {
+    "study_records": "date",
+    "exam_records": "exam_date",
+    "study_plans": "plan_date",
+}
+
+# Columns of each table, also used to whitelist requested fields
+COLUMNS = {
+    "study_records": ["student_id", "date", "subject", "chapter", "book_material", "hours_studied", "remarks", "created_at"],
+    "exam_records": ["student_id", "exam_date", "subject", "exam_type", "maximum_marks", "marks_scored", "improvements", "created_at"],
+    "study_plans": ["student_id", "plan_date", "subject", "chapter", "planned_hours", "remarks", "created_at"],
+}
+
+# Rollup tables kept current by the triggers in SCHEMA
+ROLLUP_COLUMNS = {
+    "daily_rollups": ["student_id", "day", "subject", "chapter", "planned_hours", "studied_hours", "plan_count", "study_count"],
+    "exam_rollups": ["student_id", "day", "subject", "exam_type", "marks_scored", "maximum_marks", "exam_count"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS study_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    book_material TEXT NOT NULL,
+    hours_studied REAL NOT NULL,
+    remarks TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS exam_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    exam_date TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    maximum_marks INTEGER NOT NULL,
+    marks_scored INTEGER NOT NULL,
+    improvements TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS study_plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    plan_date TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    planned_hours REAL NOT NULL,
+    remarks TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_study_records_student_date_subject_chapter
+    ON study_records (student_id, date, subject, chapter);
+CREATE INDEX IF NOT EXISTS idx_study_plans_student_date_subject_chapter
+    ON study_plans (student_id, plan_date, subject, chapter);
+CREATE INDEX IF NOT EXISTS idx_exam_records_student_date_subject_type
+    ON exam_records (student_id, exam_date, subject, exam_type);
+"""
+
+# Indexes, triggers and rollups from before student_id; the rollups are
+# recreated by ROLLUP_SCHEMA and rebuilt
+LEGACY_SCHEMA = """
+DROP INDEX IF EXISTS idx_study_records_date_subject_chapter;
+DROP INDEX IF EXISTS idx_study_plans_date_subject_chapter;
+DROP INDEX IF EXISTS idx_exam_records_date_subject_type;
+DROP TRIGGER IF EXISTS study_records_rollup_insert;
+DROP TRIGGER IF EXISTS study_records_rollup_delete;
+DROP TRIGGER IF EXISTS study_plans_rollup_insert;
+DROP TRIGGER IF EXISTS study_plans_rollup_delete;
+DROP TRIGGER IF EXISTS exam_records_rollup_insert;
+DROP TRIGGER IF EXISTS exam_records_rollup_delete;
+DROP TABLE IF EXISTS daily_rollups;
+DROP TABLE IF EXISTS exam_rollups;
+"""
+
+# Daily summaries, updated in the same transaction as every insert and delete
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    student_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    planned_hours REAL NOT NULL DEFAULT 0,
+    studied_hours REAL NOT NULL DEFAULT 0,
+    plan_count INTEGER NOT NULL DEFAULT 0,
+    study_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, day, subject, chapter)
+);
+CREATE TABLE IF NOT EXISTS exam_rollups (
+    student_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    marks_scored INTEGER NOT NULL DEFAULT 0,
+    maximum_marks INTEGER NOT NULL DEFAULT 0,
+    exam_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, day, subject, exam_type)
+);
+CREATE TRIGGER IF NOT EXISTS study_records_rollup_insert AFTER INSERT ON study_records BEGIN
+    INSERT INTO daily_rollups (student_id, day, subject, chapter, studied_hours, study_count)
+    VALUES (NEW.student_id, NEW.date, NEW.subject, NEW.chapter, NEW.hours_studied, 1)
+    ON CONFLICT (student_id, day, subject, chapter) DO UPDATE SET
+        studied_hours = studied_hours + excluded.studied_hours, study_count = study_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS study_records_rollup_delete AFTER DELETE ON study_records BEGIN
+    UPDATE daily_rollups SET studied_hours = studied_hours - OLD.hours_studied, study_count = study_count - 1
+    WHERE student_id = OLD.student_id AND day = OLD.date AND subject = OLD.subject AND chapter = OLD.chapter;
+    DELETE FROM daily_rollups
+    WHERE student_id = OLD.student_id AND day = OLD.date AND subject = OLD.subject AND chapter = OLD.chapter
+      AND plan_count <= 0 AND study_count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS study_plans_rollup_insert AFTER INSERT ON study_plans BEGIN
+    INSERT INTO daily_rollups (student_id, day, subject, chapter, planned_hours, plan_count)
+    VALUES (NEW.student_id, NEW.plan_date, NEW.subject, NEW.chapter, NEW.planned_hours, 1)
+    ON CONFLICT (student_id, day, subject, chapter) DO UPDATE SET
+        planned_hours = planned_hours + excluded.planned_hours, plan_count = plan_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS study_plans_rollup_delete AFTER DELETE ON study_plans BEGIN
+    UPDATE daily_rollups SET planned_hours = planned_hours - OLD.planned_hours, plan_count = plan_count - 1
+    WHERE student_id = OLD.student_id AND day = OLD.plan_date AND subject = OLD.subject AND chapter = OLD.chapter;
+    DELETE FROM daily_rollups
+    WHERE student_id = OLD.student_id AND day = OLD.plan_date AND subject = OLD.subject AND chapter = OLD.chapter
+      AND plan_count <= 0 AND study_count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS exam_records_rollup_insert AFTER INSERT ON exam_records BEGIN
+    INSERT INTO exam_rollups (student_id, day, subject, exam_type, marks_scored, maximum_marks, exam_count)
+    VALUES (NEW.student_id, NEW.exam_date, NEW.subject, NEW.exam_type, NEW.marks_scored, NEW.maximum_marks, 1)
+    ON CONFLICT (student_id, day, subject, exam_type) DO UPDATE SET
+        marks_scored = marks_scored + excluded.marks_scored,
+        maximum_marks = maximum_marks + excluded.maximum_marks,
+        exam_count = exam_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS exam_records_rollup_delete AFTER DELETE ON exam_records BEGIN
+    UPDATE exam_rollups SET marks_scored = marks_scored - OLD.marks_scored,
+        maximum_marks = maximum_marks - OLD.maximum_marks, exam_count = exam_count - 1
+    WHERE student_id = OLD.student_id AND day = OLD.exam_date AND subject = OLD.subject AND exam_type = OLD.exam_type;
+    DELETE FROM exam_rollups
+    WHERE student_id = OLD.student_id AND day = OLD.exam_date AND subject = OLD.subject
+      AND exam_type = OLD.exam_type AND exam_count <= 0;
+END;
+"""
+
+REBUILD_ROLLUPS = """
+DELETE FROM daily_rollups;
+INSERT INTO daily_rollups (student_id, day, subject, chapter, planned_hours, studied_hours, plan_count, study_count)
+SELECT student_id, day, subject, chapter, SUM(planned_hours), SUM(studied_hours), SUM(plan_count), SUM(study_count)
+FROM (
+    SELECT student_id, plan_date AS day, subject, chapter, planned_hours, 0 AS studied_hours,
+           1 AS plan_count, 0 AS study_count
+    FROM study_plans
+    UNION ALL
+    SELECT student_id, date, subject, chapter, 0, hours_studied, 0, 1 FROM study_records
+) GROUP BY student_id, day, subject, chapter;
+DELETE FROM exam_rollups;
+INSERT INTO exam_rollups (student_id, day, subject, exam_type, marks_scored, maximum_marks, exam_count)
+SELECT student_id, exam_date, subject, exam_type, SUM(marks_scored), SUM(maximum_marks), COUNT(*)
+FROM exam_records GROUP BY student_id, exam_date, subject, exam_type;
+"""
+
+# ---- CONNECTIONS ----
+
+_local = threading.local()
+_db_initialised = False
+_init_lock = threading.Lock()
+
+def get_connection():
+    """Return this thread's SQLite connection, opening it on first use.
+
+    sqlite3 connections cannot be shared between threads, so each Streamlit
+    session thread gets its own. WAL mode lets readers run alongside a writer.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SQLITE_PATH, cached_statements=CACHED_STATEMENTS)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+def migrate_student_ids(conn):
+    """Add student_id to tables created before it existed, owned by DEFAULT_STUDENT_ID.
+
+    Returns the names of the migrated tables; their old indexes, triggers and
+    rollups are dropped so SCHEMA and ROLLUP_SCHEMA recreate them.
+    """
+    migrated = []
+    default = DEFAULT_STUDENT_ID.replace("'", "''")
+    for collection_name in COLLECTIONS:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({collection_name})")}
+        if columns and "student_id" not in columns:
+            conn.execute(
+                f"ALTER TABLE {collection_name} ADD COLUMN student_id TEXT NOT NULL DEFAULT '{default}'"
+            )
+            migrated.append(collection_name)
+    if migrated:
+        conn.executescript(LEGACY_SCHEMA)
+    return migrated
+
+def init_db():
+    """Create tables, indexes and rollups once per process."""
+    global _db_initialised
+    if _db_initialised:
+        return
+    with _init_lock:
+        if not _db_initialised:
+            conn = get_connection()
+            with conn:
+                migrated = migrate_student_ids(conn)
+            has_rollups = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollups'"
+            ).fetchone()
+            with conn:
+                conn.executescript(SCHEMA + ROLLUP_SCHEMA)
+            if not has_rollups or migrated:
+                # Databases created before rollups or student_id existed are summarised once
+                rebuild_rollups()
+            _db_initialised = True
+
+def rebuild_rollups():
+    """Regenerate the rollup tables from the raw records in one transaction."""
+    conn = get_connection()
+    try:
+        conn.executescript("BEGIN;" + REBUILD_ROLLUPS + "COMMIT;")
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return {
+        rollup: conn.execute(f"SELECT COUNT(*) FROM {rollup}").fetchone()[0]
+        for rollup in ROLLUP_COLUMNS
+    }
+
+# ---- QUERY HELPERS ----
+
+def _to_date_text(value):
+    """Normalise a date, datetime or ISO date string to "YYYY-MM-DD"."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return datetime.fromisoformat(str(value)).date().isoformat()
+
+def _now_text():
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+def _build_where(date_field, student_id, start_date=None, end_date=None, **in_filters):
+    """Translate dashboard filters for one student into WHERE clauses and their parameters."""
+    clauses = ["student_id = ?"]
+    params = [student_id]
+    for field, values in in_filters.items():
+        if values:
+            values = list(values)
+            clauses.append(f"{field} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if start_date:
+        clauses.append(f"{date_field} >= ?")
+        params.append(_to_date_text(start_date))
+    if end_date:
+        clauses.append(f"{date_field} <= ?")
+        params.append(_to_date_text(end_date))
+    return clauses, params
+
+def _select_columns(collection_name, fields):
+    columns = fields or COLUMNS[collection_name]
+    unknown = set(columns) - set(COLUMNS[collection_name])
+    if unknown:
+        raise ValueError(f"Unknown fields for {collection_name}: {sorted(unknown)}")
+    return ["CAST(id AS TEXT) AS _id", *columns]
+
+def _to_frame(collection_name, cursor):
+    """Build a compact typed DataFrame (see frames.py) from a cursor."""
+    columns = [description[0] for description in cursor.description]
+    return compact_frame(pd.DataFrame.from_records(cursor.fetchall(), columns=columns))
+
+def _load_frame(collection_name, clauses, params, fields):
+    sql = f"SELECT {', '.join(_select_columns(collection_name, fields))} FROM {collection_name}"
+    sql += " WHERE " + " AND ".join(clauses)
+    return _to_frame(collection_name, get_connection().execute(sql, params))
+
+def _load_page(collection_name, clauses, params, fields, page_size, after):
+    """Fetch one page, newest first, seeking past the (date, id) cursor after.
+
+    Returns (frame, next_cursor); next_cursor is None on the last page.
+    """
+    date_field = DATE_FIELDS[collection_name]
+    clauses, params = list(clauses), list(params)
+    if after is not None:
+        clauses.append(f"({date_field} < ? OR ({date_field} = ? AND id < ?))")
+        params.extend([after[0], after[0], int(after[1])])
+    columns = _select_columns(collection_name, fields)
+    sql = f"SELECT {', '.join(columns)}, {date_field} AS _page_date FROM {collection_name}"
+    sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {date_field} DESC, id DESC LIMIT ?"
+    cursor = get_connection().execute(sql, [*params, page_size + 1])
+    df = _to_frame(collection_name, cursor)
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        next_cursor = (df["_page_date"].iloc[-1], df["_id"].iloc[-1])
+    return df.drop(columns="_page_date").reset_index(drop=True), next_cursor
+
+def _delete(collection_name, student_id, record_id, label):
+    try:
+        row_id = int(record_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {label} ID format.")
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            f"DELETE FROM {collection_name} WHERE id = ? AND student_id = ?", (row_id, student_id)
+        )
+    if cursor.rowcount == 0:
+        raise ValueError(f"{label.capitalize()} ID not found.")
+
+def _check_delete_criteria(record_ids, *filters):
+    # A bulk delete without IDs or filters would remove all of a student's records
+    if not record_ids and not any(filters):
+        raise ValueError("Select records or set a filter to delete.")
+
+def _delete_many(collection_name, clauses, params, record_ids, label, dry_run):
+    """Delete the rows matching clauses (and record_ids, if given) in one statement.
+
+    The rollup triggers run in the same transaction. Returns the number of
+    rows deleted, or with dry_run the number that would be.
+    """
+    clauses, params = list(clauses), list(params)
+    if record_ids:
+        try:
+            row_ids = [int(record_id) for record_id in record_ids]
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {label} ID format.")
+        # One parameter however many IDs are selected
+        clauses.append("id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(row_ids))
+    where = " WHERE " + " AND ".join(clauses)
+    conn = get_connection()
+    if dry_run:
+        return conn.execute(f"SELECT COUNT(*) FROM {collection_name}{where}", params).fetchone()[0]
+    with conn:
+        return conn.execute(f"DELETE FROM {collection_name}{where}", params).rowcount
+
+def iter_record_batches(student_id, collection_name, batch_size=1000, fields=None):
+    """Yield a student's rows of a table as lists of at most batch_size dicts."""
+    columns = _select_columns(collection_name, fields)
+    cursor = get_connection().execute(
+        f"SELECT {', '.join(columns)} FROM {collection_name} WHERE student_id = ?", (student_id,)
+    )
+    names = [description[0] for description in cursor.description]
+    date_columns = {DATE_FIELDS[collection_name], "created_at"}
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        batch = []
+        for row in rows:
+            doc = dict(zip(names, row))
+            for column in date_columns.intersection(doc):
+                doc[column] = _parse_datetime(doc[column])
+            batch.append(doc)
+        yield batch
+
+def get_distinct_values(student_id, collection_name, field):
+    """Return the sorted distinct values of field for a student, e.g. for filter options."""
+    _select_columns(collection_name, [field])
+    cursor = get_connection().execute(
+        f"SELECT DISTINCT {field} FROM {collection_name} "
+        f"WHERE student_id = ? AND {field} IS NOT NULL ORDER BY {field}",
+        (student_id,),
+    )
+    return [row[0] for row in cursor]
+
+def get_students():
+    """Return the sorted IDs of all students with records, from the small rollups."""
+    cursor = get_connection().execute(
+        "SELECT student_id FROM daily_rollups UNION SELECT student_id FROM exam_rollups ORDER BY student_id"
+    )
+    return [row[0] for row in cursor]
+
+# ---- STUDY RECORDS ----
+
+def add_study_record(student_id, date, subject, chapter, book_material, hours_studied, remarks):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO study_records "
+            "(student_id, date, subject, chapter, book_material, hours_studied, remarks, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (student_id, _to_date_text(date), subject, chapter, book_material, hours_studied, remarks, _now_text()),
+        )
+
+def _study_where(student_id, subjects=None, chapters=None, book_materials=None, start_date=None, end_date=None):
+    return _build_where(
+        "date", student_id, start_date, end_date,
+        subject=subjects, chapter=chapters, book_material=book_materials,
+    )
+
+def get_study_records(student_id, subjects=None, chapters=None, book_materials=None,
+                      start_date=None, end_date=None, fields=None):
+    clauses, params = _study_where(student_id, subjects, chapters, book_materials, start_date, end_date)
+    return _load_frame("study_records", clauses, params, fields)
+
+def get_study_records_page(student_id, subjects=None, chapters=None, book_materials=None,
+                           start_date=None, end_date=None, fields=None,
+                           page_size=50, after=None):
+    """Return (frame, next_cursor) for one page of study records, newest first."""
+    clauses, params = _study_where(student_id, subjects, chapters, book_materials, start_date, end_date)
+    return _load_page("study_records", clauses, params, fields, page_size, after)
+
+def delete_study_record(student_id, record_id):
+    _delete("study_records", student_id, record_id, "Study Record")
+
+def delete_study_records(student_id, record_ids=None, subjects=None, chapters=None, book_materials=None,
+                         start_date=None, end_date=None, dry_run=False):
+    """Delete the study records with record_ids and/or matching the filters.
+
+    Returns the number deleted, or with dry_run the number that would be.
+    """
+    _check_delete_criteria(record_ids, subjects, chapters, book_materials, start_date, end_date)
+    clauses, params = _study_where(student_id, subjects, chapters, book_materials, start_date, end_date)
+    return _delete_many("study_records", clauses, params, record_ids, "Study Record", dry_run)
+
+# ---- EXAM RECORDS ----
+
+def add_exam_record(student_id, exam_date, subject, exam_type, maximum_marks, marks_scored, improvements):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO exam_records "
+            "(student_id, exam_date, subject, exam_type, maximum_marks, marks_scored, improvements, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (student_id, _to_date_text(exam_date), subject, exam_type, maximum_marks, marks_scored, improvements, _now_text()),
+        )
+
+def _exam_where(student_id, subjects=None, exam_types=None, start_date=None, end_date=None):
+    return _build_where("exam_date", student_id, start_date, end_date, subject=subjects, exam_type=exam_types)
+
+def get_exam_records(student_id, subjects=None, exam_types=None, start_date=None, end_date=None, fields=None):
+    clauses, params = _exam_where(student_id, subjects, exam_types, start_date, end_date)
+    return _load_frame("exam_records", clauses, params, fields)
+
+def get_exam_records_page(student_id, subjects=None, exam_types=None, start_date=None, end_date=None,
+                          fields=None, page_size=50, after=None):
+    """Return (frame, next_cursor) for one page of exam records, newest first."""
+    clauses, params = _exam_where(student_id, subjects, exam_types, start_date, end_date)
+    return _load_page("exam_records", clauses, params, fields, page_size, after)
+
+def delete_exam_record(student_id, record_id):
+    _delete("exam_records", student_id, record_id, "Exam Record")
+
+def delete_exam_records(student_id, record_ids=None, subjects=None, exam_types=None,
+                        start_date=None, end_date=None, dry_run=False):
+    """Delete the exam records with record_ids and/or matching the filters.
+
+    Returns the number deleted, or with dry_run the number that would be.
+    """
+    _check_delete_criteria(record_ids, subjects, exam_types, start_date, end_date)
+    clauses, params = _exam_where(student_id, subjects, exam_types, start_date, end_date)
+    return _delete_many("exam_records", clauses, params, record_ids, "Exam Record", dry_run)
+
+# ---- STUDY PLANS ----
+
+def add_study_plan(student_id, plan_date, subject, chapter, planned_hours, remarks):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO study_plans (student_id, plan_date, subject, chapter, planned_hours, remarks, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (student_id, _to_date_text(plan_date), subject, chapter, planned_hours, remarks, _now_text()),
+        )
+
+def _plan_where(student_id, subjects=None, chapters=None, start_date=None, end_date=None):
+    return _build_where("plan_date", student_id, start_date, end_date, subject=subjects, chapter=chapters)
+
+def get_study_plans(student_id, subjects=None, chapters=None, start_date=None, end_date=None, fields=None):
+    clauses, params = _plan_where(student_id, subjects, chapters, start_date, end_date)
+    return _load_frame("study_plans", clauses, params, fields)
+
+def get_study_plans_page(student_id, subjects=None, chapters=None, start_date=None, end_date=None,
+                         fields=None, page_size=50, after=None):
+    """Return (frame, next_cursor) for one page of study plans, newest first."""
+    clauses, params = _plan_where(student_id, subjects, chapters, start_date, end_date)
+    return _load_page("study_plans", clauses, params, fields, page_size, after)
+
+def delete_study_plan(student_id, record_id):
+    _delete("study_plans", student_id, record_id, "Study Plan Record")
+
+def delete_study_plans(student_id, record_ids=None, subjects=None, chapters=None,
+                       start_date=None, end_date=None, dry_run=False):
+    """Delete the study plans with record_ids and/or matching the filters.
+
+    Returns the number deleted, or with dry_run the number that would be.
+    """
+    _check_delete_criteria(record_ids, subjects, chapters, start_date, end_date)
+    clauses, params = _plan_where(student_id, subjects, chapters, start_date, end_date)
+    return _delete_many("study_plans", clauses, params, record_ids, "Study Plan Record", dry_run)
+
+# ---- BULK WRITES ----
+
+def insert_records(student_id, collection_name, docs):
+    """Insert a student's already-validated rows in a single transaction.
+
+    The date field is normalised and student_id and created_at are set. Returns
+    (inserted_count, errors) where errors lists (position in docs, message)
+    for rows SQLite rejected; the rest are still written.
+    """
+    if not docs:
+        return 0, []
+    columns = COLUMNS[collection_name]
+    date_field = DATE_FIELDS[collection_name]
+    now = _now_text()
+    sql = (
+        f"INSERT INTO {collection_name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+    rows = [
+        tuple(_to_date_text(doc[date_field]) if column == date_field
+              else now if column == "created_at"
+              else student_id if column == "student_id"
+              else doc.get(column)
+              for column in columns)
+        for doc in docs
+    ]
+    conn = get_connection()
+    inserted, errors = 0, []
+    with conn:
+        for position, row in enumerate(rows):
+            try:
+                conn.execute(sql, row)
+                inserted += 1
+            except sqlite3.Error as e:
+                errors.append((position, str(e)))
+    return inserted, errors
+
+# ---- PENDING WRITES ----
+
+def get_pending_writes(student_id, collection_name, fields=None):
+    """SQLite writes are local and immediate, so nothing is ever pending."""
+    return _to_frame(collection_name, get_connection().execute(
+        f"SELECT {', '.join(_select_columns(collection_name, fields))} FROM {collection_name} WHERE 0"
+    ))
+
+# ---- AGGREGATES ----
+
+PLANNED_VS_ACTUAL_COLUMNS = ["date", "subject", "chapter", "planned_hours", "hours_studied"]
+
+def get_planned_vs_actual(student_id, subjects=None, chapters=None, book_materials=None,
+                          start_date=None, end_date=None):
+    """Return planned and actual study hours per (date, subject, chapter).
+
+    book_materials only narrows the study records, since plans have no material.
+    """
+    plan_clauses, plan_params = _plan_where(student_id, subjects, chapters, start_date, end_date)
+    study_clauses, study_params = _study_where(student_id, subjects, chapters, book_materials, start_date, end_date)
+    plan_where = " WHERE " + " AND ".join(plan_clauses)
+    study_where = " WHERE " + " AND ".join(study_clauses)
+    sql = (
+        "SELECT date, subject, chapter, SUM(planned_hours) AS planned_hours, SUM(hours_studied) AS hours_studied "
+        "FROM ("
+        f"SELECT plan_date AS date, subject, chapter, planned_hours, 0 AS hours_studied FROM study_plans{plan_where} "
+        "UNION ALL "
+        f"SELECT date, subject, chapter, 0 AS planned_hours, hours_studied FROM study_records{study_where}"
+        ") GROUP BY date, subject, chapter ORDER BY date DESC, subject, chapter"
+    )
+    cursor = get_connection().execute(sql, [*plan_params, *study_params])
+    return compact_frame(pd.DataFrame.from_records(cursor.fetchall(), columns=PLANNED_VS_ACTUAL_COLUMNS))
+
+# ---- ROLLUP SUMMARIES ----
+
+def _load_rollups(rollup, clauses, params):
+    sql = f"SELECT {', '.join(ROLLUP_COLUMNS[rollup])} FROM {rollup}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    cursor = get_connection().execute(sql, params)
+    return compact_frame(pd.DataFrame.from_records(cursor.fetchall(), columns=ROLLUP_COLUMNS[rollup]), numeric=False)
+
+def get_daily_rollups(student_id, subjects=None, chapters=None, start_date=None, end_date=None):
+    """Return a student's daily planned/studied hours and counts per (day, subject, chapter)."""
+    clauses, params = _build_where("day", student_id, start_date, end_date, subject=subjects, chapter=chapters)
+    return _load_rollups("daily_rollups", clauses, params)
+
+def get_exam_rollups(student_id, subjects=None, exam_types=None, start_date=None, end_date=None):
+    """Return a student's daily marks, maximum marks and exam counts per (day, subject, exam_type)."""
+    clauses, params = _build_where("day", student_id, start_date, end_date, subject=subjects, exam_type=exam_types)
+    return _load_rollups("exam_rollups", clauses, params)
+
+CLASS_SUMMARY_COLUMNS = [
+    "subject", "students", "planned_hours", "studied_hours", "hours_per_student",
+    "exam_students", "exams", "average_percentage",
+]
+
+def get_class_summary(student_ids=None, subjects=None, start_date=None, end_date=None):
+    """Return class-level totals per subject across students.
+
+    Hours come from daily_rollups and marks from exam_rollups, summed per
+    (subject, student) and then per subject in SQL. student_ids narrows the
+    class; None means every student. average_percentage is the mean of the
+    students' percentages.
+    """
+    clauses, params = [], []
+    for field, values in (("student_id", student_ids), ("subject", subjects)):
+        if values:
+            values = list(values)
+            clauses.append(f"{field} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if start_date:
+        clauses.append("day >= ?")
+        params.append(_to_date_text(start_date))
+    if end_date:
+        clauses.append("day <= ?")
+        params.append(_to_date_text(end_date))
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    sql = f"""
+    WITH hours AS (
+        SELECT subject, COUNT(*) AS students, SUM(planned_hours) AS planned_hours,
+               SUM(studied_hours) AS studied_hours
+        FROM (
+            SELECT subject, student_id, SUM(planned_hours) AS planned_hours, SUM(studied_hours) AS studied_hours
+            FROM daily_rollups{where} GROUP BY subject, student_id
+        ) GROUP BY subject
+    ), exams AS (
+        SELECT subject, COUNT(*) AS exam_students, SUM(exam_count) AS exams,
+               AVG(CASE WHEN maximum_marks > 0 THEN 100.0 * marks_scored / maximum_marks END)
+                   AS average_percentage
+        FROM (
+            SELECT subject, student_id, SUM(marks_scored) AS marks_scored,
+                   SUM(maximum_marks) AS maximum_marks, SUM(exam_count) AS exam_count
+            FROM exam_rollups{where} GROUP BY subject, student_id
+        ) GROUP BY subject
+    ), subjects AS (
+        SELECT subject FROM hours UNION SELECT subject FROM exams
+    )
+    SELECT subjects.subject, COALESCE(students, 0), COALESCE(planned_hours, 0), COALESCE(studied_hours, 0),
+           studied_hours / NULLIF(students, 0), COALESCE(exam_students, 0), COALESCE(exams, 0), average_percentage
+    FROM subjects
+    LEFT JOIN hours ON hours.subject = subjects.subject
+    LEFT JOIN exams ON exams.subject = subjects.subject
+    ORDER BY subjects.subject
+    """
+    cursor = get_connection().execute(sql, [*params, *params])
+    return compact_frame(
+        pd.DataFrame.from_records(cursor.fetchall(), columns=CLASS_SUMMARY_COLUMNS), numeric=False
+    )
+
+# ---- Optional: Test connection snippet ----
+if __name__ == "__main__":
+    if sys.argv[1:] == ["rebuild-rollups"]:
+        init_db()
+        print("Rebuilt rollups:", rebuild_rollups())
+        sys.exit()
+    try:
+        init_db()
+        for name in COLLECTIONS:
+            count = get_connection().execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            print(f"{name}: {count} rows")
+        print("✅ SQLite database ready:", SQLITE_PATH)
+    except Exception as e:
+        print("❌ SQLite database check failed:", e)
@@ -0,0 +1,196 @@
+# storage.py
+#
+# Selects the storage backend used by the app. Every backend module exposes
+# the functions in BACKEND_FUNCTIONS with the same signatures and return types.
+# Record functions take the owning student's ID as their first argument.
+
+import importlib
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import bind_run, timed
+
+# "mongo" (MongoDB Atlas, default) or "sqlite" (local file, no network needed)
+BACKEND = os.environ.get("STUDY_TRACKER_BACKEND", "mongo").lower()
+# Student selected when the app opens; the backends also give records from
+# before student_id existed to this student
+DEFAULT_STUDENT_ID = os.environ.get("STUDY_TRACKER_DEFAULT_STUDENT", "priyanshi")
+
+# Threads shared by all sessions for concurrent reads, see fetch_all()
+FETCH_WORKERS = int(os.environ.get("STUDY_TRACKER_FETCH_WORKERS", "8"))
+# Batches each collection may read ahead of the consumer in prefetch_record_batches()
+PREFETCH_BATCHES = 2
+
+BACKEND_MODULES = {
+    "mongo": "mongo_connector",
+    "sqlite": "sqlite_connector",
+}
+
+BACKEND_FUNCTIONS = [
+    "add_study_record", "get_study_records", "delete_study_record",
+    "add_exam_record", "get_exam_records", "delete_exam_record",
+    "add_study_plan", "get_study_plans", "delete_study_plan",
+    "delete_study_records", "delete_exam_records", "delete_study_plans",
+    "get_study_records_page", "get_exam_records_page", "get_study_plans_page",
+    "get_distinct_values", "get_planned_vs_actual",
+    "get_daily_rollups", "get_exam_rollups", "rebuild_rollups", "get_pending_writes",
+    "get_students", "get_class_summary",
+    "iter_record_batches", "insert_records", "init_db",
+]
+
+def load_backend(name):
+    """Import the backend module for name and check it implements the interface."""
+    if name not in BACKEND_MODULES:
+        raise ValueError(f"Unknown storage backend: {name}")
+    backend = importlib.import_module(BACKEND_MODULES[name])
+    missing = [func for func in BACKEND_FUNCTIONS if not hasattr(backend, func)]
+    if missing:
+        raise TypeError(f"Storage backend {name} is missing: {', '.join(missing)}")
+    return backend
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Return the configured backend module, importing it on first use.
+
+    Deferring the import keeps pandas and the database driver out of the
+    app's cold start until data is actually needed.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = load_backend(BACKEND)
+    return _backend
+
+def __getattr__(name):
+    # storage.backend still works, resolving lazily
+    if name == "backend":
+        return get_backend()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _instrumented(name):
+    # Every call is timed as storage.<name>; see instrumentation.py
+    @timed(f"storage.{name}")
+    def call(*args, **kwargs):
+        return getattr(get_backend(), name)(*args, **kwargs)
+    call.__name__ = call.__qualname__ = name
+    return call
+
+add_study_record = _instrumented("add_study_record")
+get_study_records = _instrumented("get_study_records")
+get_study_records_page = _instrumented("get_study_records_page")
+delete_study_record = _instrumented("delete_study_record")
+delete_study_records = _instrumented("delete_study_records")
+
+add_exam_record = _instrumented("add_exam_record")
+get_exam_records = _instrumented("get_exam_records")
+get_exam_records_page = _instrumented("get_exam_records_page")
+delete_exam_record = _instrumented("delete_exam_record")
+delete_exam_records = _instrumented("delete_exam_records")
+
+add_study_plan = _instrumented("add_study_plan")
+get_study_plans = _instrumented("get_study_plans")
+get_study_plans_page = _instrumented("get_study_plans_page")
+delete_study_plan = _instrumented("delete_study_plan")
+delete_study_plans = _instrumented("delete_study_plans")
+
+get_distinct_values = _instrumented("get_distinct_values")
+get_planned_vs_actual = _instrumented("get_planned_vs_actual")
+get_daily_rollups = _instrumented("get_daily_rollups")
+get_exam_rollups = _instrumented("get_exam_rollups")
+rebuild_rollups = _instrumented("rebuild_rollups")
+get_students = _instrumented("get_students")
+get_class_summary = _instrumented("get_class_summary")
+get_pending_writes = _instrumented("get_pending_writes")
+insert_records = _instrumented("insert_records")
+init_db = _instrumented("init_db")
+
+def iter_record_batches(student_id, collection_name, batch_size=1000, fields=None):
+    # Not timed: it returns a generator, so the call itself does no work
+    return get_backend().iter_record_batches(student_id, collection_name, batch_size, fields)
+
+# ---- CONCURRENT FETCHING ----
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="storage-fetch")
+
+def fetch_all(calls):
+    """Run independent reads in parallel and return their results.
+
+    calls maps a name to a function taking no arguments, e.g.
+    {"plans": lambda: get_study_plans(student, subjects=["Math"])}. Returns
+    {name: result} once every call has finished, so the wait is about the
+    slowest read rather than the sum. The first exception is re-raised.
+    Timings recorded by the calls count towards the caller's rerun.
+    """
+    futures = {name: _executor.submit(bind_run(call)) for name, call in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+_DONE = object()
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+def _put(batches, item, stop):
+    # Give up once the consumer has gone away instead of blocking forever
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _read_ahead(student_id, collection_name, batch_size, batches, stop):
+    try:
+        for batch in iter_record_batches(student_id, collection_name, batch_size):
+            if not _put(batches, batch, stop):
+                return
+        _put(batches, _DONE, stop)
+    except Exception as e:
+        _put(batches, _Failed(e), stop)
+
+def _drain(batches):
+    while True:
+        item = batches.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+class prefetch_record_batches:
+    """Read several collections of one student at once in background threads.
+
+    Used as a context manager, yields {collection_name: batch iterator}.
+    Each collection is read by its own thread at most PREFETCH_BATCHES
+    batches ahead, so consuming the collections one after another overlaps
+    their database round trips while memory stays bounded. Leaving the
+    block stops any readers that are still running.
+    """
+
+    def __init__(self, student_id, collection_names, batch_size=1000, max_pending=PREFETCH_BATCHES):
+        self.student_id = student_id
+        self.collection_names = list(collection_names)
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+    def __enter__(self):
+        self._stop = threading.Event()
+        iterators = {}
+        for collection_name in self.collection_names:
+            batches = queue.Queue(self.max_pending)
+            threading.Thread(
+                target=bind_run(_read_ahead), args=(self.student_id, collection_name, self.batch_size, batches, self._stop),
+                name=f"prefetch-{collection_name}", daemon=True,
+            ).start()
+            iterators[collection_name] = _drain(batches)
+        return iterators
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        return False
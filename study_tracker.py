@@ -1,390 +1,673 @@
+import html
+import time
+import zlib
+
+# Streamlit executes this file on every rerun; first paint is measured from here
+_RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-from datetime import date, datetime
-import plotly.express as px
-from io import BytesIO
-
-# Import MongoDB database functions from your separate connector module
-from mongo_connector import (
-    add_study_record, get_study_records, delete_study_record,
-    add_exam_record, get_exam_records, delete_exam_record,
-    add_study_plan, get_study_plans, delete_study_plan
+from datetime import date
+
+# Import database functions from the configured storage backend (MongoDB or SQLite).
+# The backend and its drivers (pymongo or sqlite3, pandas) load on the first call;
+# pandas, plotly and the analytics helpers are imported where they are first used.
+from storage import (
+    add_study_record, get_study_records_page, delete_study_records,
+    add_exam_record, get_exam_records_page, delete_exam_records,
+    add_study_plan, get_study_plans_page, delete_study_plans,
+    get_distinct_values, get_planned_vs_actual, get_daily_rollups, get_exam_rollups,
+    get_pending_writes, get_students, get_class_summary, init_db
 )
+from constants import SUBJECT_CHAPTERS, BOOK_MATERIALS, EXAM_TYPES
+from exporter import EXPORT_FORMATS, export_all_data
+from importer import import_workbook
+from instrumentation import get_metrics, get_run_timings, record_startup, start_metrics_server, start_run, timed
+import storage
+from storage import DEFAULT_STUDENT_ID, fetch_all
 
 st.set_page_config(
-    page_title="CBSE Class 10 Study Tracker - Priyanshi",
+    page_title="CBSE Class 10 Study Tracker",
     page_icon="📚",
     layout="wide"
 )
 
-SUBJECT_CHAPTERS = {
-    "Science": [
-        "Light - Reflection and Refraction",
-        "Human Eye and Colourful World",
-        "Electricity",
-        "Magnetic Effects of Electric Current",
-        "Sources of Energy",
-        "Life Processes",
-        "Control and Coordination",
-        "How do Organisms Reproduce",
-        "Heredity and Evolution",
-        "Our Environment",
-        "Natural Resource Management",
-        "Acids, Bases and Salts",
-        "Metals and Non-metals",
-        "Carbon and its Compounds",
-        "Periodic Classification of Elements"
-    ],
-    "Math": [
-        "Real Numbers",
-        "Polynomials",
-        "Pair of Linear Equations in Two Variables",
-        "Quadratic Equations",
-        "Arithmetic Progressions",
-        "Triangles",
-        "Coordinate Geometry",
-        "Introduction to Trigonometry",
-        "Some Applications of Trigonometry",
-        "Circles",
-        "Constructions",
-        "Areas Related to Circles",
-        "Surface Areas and Volumes",
-        "Statistics",
-        "Probability"
-    ],
-    "English": [
-        "A Letter to God",
-        "Nelson Mandela: Long Walk to Freedom",
-        "Two Stories about Flying",
-        "From the Diary of Anne Frank",
-        "Glimpses of India",
-        "Mijbil the Otter",
-        "Madam Rides the Bus",
-        "The Sermon at Benares",
-        "The Proposal",
-        "A Triumph of Surgery",
-        "The Thief's Story",
-        "The Midnight Visitor",
-        "A Question of Trust",
-        "Footprints without Feet",
-        "The Making of a Scientist",
-        "The Necklace",
-        "Bholi",
-        "The Book That Saved the Earth"
-    ],
-    "SS": [
-        "Resources and Development",
-        "Forest and Wildlife Resources",
-        "Water Resources",
-        "Agriculture",
-        "Minerals and Energy Resources",
-        "Manufacturing Industries",
-        "Lifelines of National Economy",
-        "The Rise of Nationalism in Europe",
-        "Nationalism in India",
-        "The Making of a Global World",
-        "The Age of Industrialisation",
-        "Print Culture and the Modern World",
-        "Power Sharing",
-        "Federalism",
-        "Democracy and Diversity",
-        "Gender, Religion and Caste",
-        "Popular Struggles and Movements",
-        "Political Parties",
-        "Outcomes of Democracy",
-        "Challenges to Democracy",
-        "Development",
-        "Sectors of Indian Economy",
-        "Money and Credit",
-        "Globalisation and the Indian Economy",
-        "Consumer Rights"
-    ],
-    "Gujarati": [
-        "પ્રથમ અધ્યાન: સમજદારીનો માર્ગ",
-        "બીજું અધ્યાય: કુદરતના રંગ",
-        "તૃતીય અધ്യાય: જીવનના મૂલ્યો",
-        "ચોથું અધ્યાય: સંસ્કૃતિ અને પરંપરા",
-        "પાંચમું અધ્યાય: વૈજ્ઞાનિક વિચાર",
-        "છઠ્ઠું અધ્યાય: સાહિત્યનું મહત્વ",
-        "સાતમું અધ્યાય: સમાજ અને એના મુદ્દા",
-        "આઠમું અધ્યાય: જીવન કૌશલ્ય",
-        "નવમું અધ્યાય: નાયક અને પ્રેરણા",
-        "દસમું અધ્યાય: નિવૃત્તિ અને આખરી અભ્યાસ"
-    ]
-}
-
-BOOK_MATERIALS = [
-    "CBSE Textbook",
-    "KS QB",
-    "US Notes",
-    "KS Power Book",
-    "KS Objective Book",
-    "US Worksheet",
-    "Deepa mam Class"
-]
-
-EXAM_TYPES = [
-    "School Exam",
-    "KS Class Test",
-    "Mock Test",
-    "Deepa mam Class",
-    "Others"
-]
-
-def export_all_data():
-    study_df = get_study_records()
-    exam_df = get_exam_records()
-    plan_df = get_study_plans()
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for df, sheet_name in [(study_df, 'Study Records'), (exam_df, 'Exam Records'), (plan_df, 'Study Plans')]:
-            if not df.empty:
-                # Rename MongoDB _id to ID
-                if "_id" in df.columns:
-                    df.rename(columns={"_id": "ID"}, inplace=True)
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-    return output.getvalue()
+# Fields shown on the dashboards; only these are fetched from the database
+STUDY_FIELDS = ["date", "subject", "chapter", "book_material", "hours_studied", "remarks"]
+EXAM_FIELDS = ["exam_date", "subject", "exam_type", "marks_scored", "maximum_marks", "improvements"]
+PLAN_FIELDS = ["plan_date", "subject", "chapter", "planned_hours", "remarks"]
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Session state of the previous student's filters, pages and export
+STUDENT_STATE_PREFIXES = ("filter_", "study_page", "plan_page", "exam_page", "export_data", "delete_")
+
+def current_student():
+    """Return the student selected in the sidebar (DEFAULT_STUDENT_ID until one is picked)."""
+    return st.session_state.get("student") or DEFAULT_STUDENT_ID
+
+def _reset_student_state():
+    for key in list(st.session_state):
+        if key.startswith(STUDENT_STATE_PREFIXES):
+            del st.session_state[key]
+
+def _add_student():
+    new_student = st.session_state.get("new_student", "").strip()
+    if new_student:
+        st.session_state["student"] = new_student
+        st.session_state["new_student"] = ""
+        _reset_student_state()
+
+def render_student_picker():
+    """Render the sidebar student selector and return the selected student ID."""
+    student = current_student()
+    with st.sidebar:
+        st.selectbox("👤 Student", options=sorted({*get_students(), student}),
+                     key="student", on_change=_reset_student_state)
+        with st.expander("➕ New Student"):
+            st.text_input("Student ID", key="new_student")
+            st.button("Switch to Student", key="add_student", on_click=_add_student)
+    return current_student()
+
+def _change_page(key, step):
+    st.session_state[key + "_page"] += step
+
+def page_request(key, filters):
+    """Render the page size control and return (page_size, after) for the current page.
+
+    Fetch the page with these, e.g. get_study_records_page(page_size=...,
+    after=...), then call page_controls() with the returned next_cursor.
+    Cursors of visited pages are kept in session state so Previous never
+    refetches from the start; changing filters or the page size goes back
+    to page 1.
+    """
+    page_size = st.selectbox("Rows per page", options=PAGE_SIZES, index=1, key=key + "_size")
+    state = (repr(filters), page_size)
+    if st.session_state.get(key + "_state") != state:
+        st.session_state[key + "_state"] = state
+        st.session_state[key + "_cursors"] = [None]
+        st.session_state[key + "_page"] = 0
+    return page_size, st.session_state[key + "_cursors"][st.session_state[key + "_page"]]
+
+def page_controls(key, next_cursor):
+    """Remember next_cursor and render the Previous/Next buttons."""
+    cursors = st.session_state[key + "_cursors"]
+    page = st.session_state[key + "_page"]
+    if next_cursor is not None and len(cursors) == page + 1:
+        cursors.append(next_cursor)
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    prev_col.button("◀ Previous", key=key + "_prev", disabled=page == 0,
+                    on_click=_change_page, args=(key, -1))
+    page_col.caption(f"Page {page + 1}")
+    next_col.button("Next ▶", key=key + "_next", disabled=next_cursor is None,
+                    on_click=_change_page, args=(key, 1))
+
+def show_saved_message():
+    """Show the result of an add or delete from the previous run, once."""
+    message = st.session_state.pop("saved_message", None)
+    if message:
+        st.success(message)
+
+def render_table(key, df, **kwargs):
+    """Render a page of records with multi-row selection; return the selected IDs.
+
+    The selection is kept as row positions, so the widget key includes the
+    IDs shown: another page, filter, student or a delete starts a new
+    selection instead of pointing the old positions at other records.
+    """
+    shown = zlib.crc32("\n".join(map(str, df["ID"])).encode())
+    event = st.dataframe(df, use_container_width=True, on_select="rerun",
+                         selection_mode="multi-row", key=f"{key}_{shown:08x}", **kwargs)
+    rows = [row for row in event.selection.rows if row < len(df)]
+    return df["ID"].iloc[rows].tolist()
+
+def _run_delete(student, label, delete, **criteria):
+    # One bulk call; the app reruns so tables and totals show the change
+    try:
+        deleted = delete(student, **criteria)
+    except Exception as e:
+        st.error(f"Error deleting {label}: {e}")
+        return
+    st.session_state["saved_message"] = f"Deleted {deleted} {label}."
+    st.rerun()
+
+def render_selection_delete(student, label, key, delete, selected_ids):
+    """Render a button deleting the rows selected in a table."""
+    if st.button(f"🗑️ Delete {len(selected_ids)} selected {label}", key=key,
+                 disabled=not selected_ids):
+        _run_delete(student, label, delete, record_ids=selected_ids)
+
+def render_filter_delete(student, label, key, delete, **filters):
+    """Render a delete of every record matching the dashboard filters, with a dry-run count first."""
+    with st.expander(f"🗑️ Delete all {label} matching the filters"):
+        if not any(filters.values()):
+            st.caption("Set a filter above to delete a range of records.")
+            return
+        # The count is only queried once asked for
+        if not st.checkbox(f"Count matching {label}", key=key + "_count"):
+            return
+        try:
+            count = delete(student, dry_run=True, **filters)
+        except Exception as e:
+            st.error(f"Error counting {label}: {e}")
+            return
+        st.warning(f"{count} {label} match the current filters.")
+        if st.button(f"Delete {count} {label}", key=key + "_confirm", disabled=count == 0):
+            _run_delete(student, label, delete, **filters)
+
+def render_pending(label, pending):
+    """Show records saved in write-behind mode that are not in the database yet."""
+    if pending.empty:
+        return
+    st.info(f"⏳ {len(pending)} {label} saved and waiting to sync; "
+            "they appear in the tables and totals once written.")
+    st.dataframe(pending.rename(columns={"_id": "ID"}), use_container_width=True, hide_index=True)
+
+def render_export_panel(student):
+    with st.sidebar.expander("💾 Export Data"):
+        fmt = st.radio("Format", options=list(EXPORT_FORMATS), horizontal=True, key="export_format")
+        if st.button("Prepare Export", key="prepare_export"):
+            try:
+                with st.spinner("Exporting..."):
+                    with export_all_data(student, fmt) as export_file:
+                        st.session_state["export_data"] = (fmt, export_file.read())
+            except Exception as e:
+                st.error(f"Export failed: {e}")
+        if st.session_state.get("export_data", (None,))[0] == fmt:
+            file_name, mime = EXPORT_FORMATS[fmt]
+            st.download_button("Download", data=st.session_state["export_data"][1],
+                               file_name=file_name, mime=mime, key="download_export")
+
+def render_import_panel(student):
+    with st.sidebar.expander("📥 Import Data"):
+        st.caption("Upload an .xlsx in the same layout as the Excel export.")
+        upload = st.file_uploader("Workbook", type=["xlsx"], key="import_file")
+        if upload is not None and st.button("Import", key="run_import"):
+            try:
+                with st.spinner("Importing..."):
+                    results = import_workbook(student, upload)
+            except Exception as e:
+                st.error(f"Import failed: {e}")
+            else:
+                import pandas as pd
+
+                if not results:
+                    st.warning("No Study Records, Exam Records or Study Plans sheet found.")
+                for collection_name, result in results.items():
+                    st.success(f"{collection_name}: {result['inserted']} rows imported")
+                    if result["errors"]:
+                        st.error(f"{collection_name}: {len(result['errors'])} rows skipped")
+                        st.dataframe(
+                            pd.DataFrame(result["errors"], columns=["Row", "Error"]),
+                            use_container_width=True, hide_index=True
+                        )
+
+def render_performance_panel():
+    if not st.sidebar.checkbox("⏱️ Show performance timings", key="show_perf"):
+        return
+    import pandas as pd
+
+    with st.expander("⏱️ Performance (this rerun)", expanded=True):
+        timings = pd.DataFrame(get_run_timings(), columns=["operation", "ms", "error"])
+        st.dataframe(timings.round({"ms": 1}), use_container_width=True, hide_index=True)
+        metrics = get_metrics()
+        startup = {name: metrics[name]["sum"] * 1000 for name in ("app.first_paint.cold", "app.script.cold") if name in metrics}
+        if startup:
+            st.caption("Cold start: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in startup.items()))
+        for label, stats_name in [("Read cache", "get_cache_stats"), ("Connection pool", "get_pool_stats")]:
+            get_stats = getattr(storage.backend, stats_name, None)
+            if get_stats is not None:
+                st.caption(f"{label}: {get_stats()}")
+
+def render_add_study_record(student):
+    st.header("📝 Add New Study Record")
+    sel_subject = st.selectbox("📖 Subject", options=list(SUBJECT_CHAPTERS.keys()), key="study_subject")
+    with st.form("study_record_form", clear_on_submit=True):
+        chapter = st.selectbox("📑 Chapter", options=SUBJECT_CHAPTERS[sel_subject], key="study_chapter")
+        study_date = st.date_input("📅 Study Date", value=date.today())
+        book_material = st.selectbox("📘 Book/Material Used", options=BOOK_MATERIALS)
+        hours_studied = st.number_input("⏰ Hours Studied", min_value=0.0, max_value=24.0, step=0.5)
+        remarks = st.text_area("💭 Remarks (Optional)", max_chars=250)
+        submitted = st.form_submit_button("Add Study Record")
+        if submitted:
+            if hours_studied > 0:
+                try:
+                    add_study_record(student, str(study_date), sel_subject, chapter, book_material, hours_studied, remarks)
+                    st.session_state["saved_message"] = "Study record added successfully!"
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to add study record: {e}")
+            else:
+                st.error("Please enter valid hours studied (> 0).")
+
+def render_plan_study(student):
+    st.header("📅 Plan a Study Session")
+    plan_subject = st.selectbox("📖 Subject", options=list(SUBJECT_CHAPTERS.keys()), key="plan_subject")
+    with st.form("study_plan_form", clear_on_submit=True):
+        plan_chapter = st.selectbox("📑 Chapter", options=SUBJECT_CHAPTERS[plan_subject], key="plan_chapter")
+        plan_date = st.date_input("📅 Plan Date", value=date.today())
+        planned_hours = st.number_input("⏰ Planned Hours", min_value=0.0, max_value=24.0, step=0.5)
+        plan_remarks = st.text_area("💭 Notes/Remarks (Optional)", max_chars=250)
+        submitted = st.form_submit_button("Add Study Plan")
+        if submitted:
+            if planned_hours > 0:
+                try:
+                    add_study_plan(student, str(plan_date), plan_subject, plan_chapter, planned_hours, plan_remarks)
+                    st.session_state["saved_message"] = "Study plan added successfully!"
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to add study plan: {e}")
+            else:
+                st.error("Please enter valid planned hours (> 0).")
+
+def render_add_exam_result(student):
+    st.header("🎯 Add New Exam Result")
+    with st.form("exam_result_form", clear_on_submit=True):
+        exam_subject = st.selectbox("📖 Subject", options=list(SUBJECT_CHAPTERS.keys()), key="exam_subject")
+        exam_type = st.selectbox("🏆 Exam Type", options=EXAM_TYPES)
+        exam_date = st.date_input("📅 Exam Date", value=date.today())
+        col1, col2 = st.columns(2)
+        with col1:
+            maximum_marks = st.number_input("📊 Maximum Marks", min_value=1, max_value=1000, value=100, step=1, key="maximum_marks")
+        with col2:
+            marks_scored = st.number_input("✏️ Marks Scored", min_value=0, max_value=1000, value=0, step=1, key="marks_scored")
+        improvements = st.text_area("🎯 Areas for Improvement (Optional)")
+        submitted = st.form_submit_button("Add Exam Result")
+        if submitted:
+            if marks_scored > maximum_marks:
+                st.error("Marks scored cannot be more than maximum marks!")
+            else:
+                try:
+                    add_exam_record(student, str(exam_date), exam_subject, exam_type, maximum_marks, marks_scored, improvements)
+                    st.session_state["saved_message"] = "Exam result added successfully!"
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to add exam record: {e}")
+
+def render_study_dashboard(student):
+    import plotly.express as px
+    from analytics import PERIODS, period_totals
+
+    st.header("📊 Study Dashboard")
+    # Independent reads run in parallel; see storage.fetch_all
+    with timed("dashboard.study.filter_options"):
+        options = fetch_all({
+            (collection_name, field): (lambda c=collection_name, f=field: get_distinct_values(student, c, f))
+            for collection_name, field in [
+                ("study_records", "subject"), ("study_plans", "subject"),
+                ("study_records", "chapter"), ("study_plans", "chapter"),
+                ("study_records", "book_material"),
+            ]
+        })
+    subj_set = set(options["study_records", "subject"]) | set(options["study_plans", "subject"])
+
+    if not subj_set:
+        st.info("No study or plan records found yet.")
+    else:
+        chap_set = set(options["study_records", "chapter"]) | set(options["study_plans", "chapter"])
+        book_set = set(options["study_records", "book_material"])
+
+        with st.expander("Filters", expanded=True):
+            f_subject = st.multiselect("Subject", options=sorted(subj_set), key="filter_subject")
+            f_chapter = st.multiselect("Chapter", options=sorted(chap_set), key="filter_chapter")
+            f_book = st.multiselect("Book/Material Used", options=sorted(book_set), key="filter_book")
+            start_date_col, end_date_col = st.columns(2)
+            f_start_date = start_date_col.date_input("Start Date", value=None, key="filter_start_date")
+            f_end_date = end_date_col.date_input("End Date", value=None, key="filter_end_date")
+
+        # Sections are laid out first so the page size control sits with its
+        # table, then all of their data is fetched at once.
+        planned_box, trends_box, records_box, plans_box = (
+            st.container(), st.container(), st.container(), st.container()
+        )
+        with records_box:
+            st.markdown("### Study Records")
+            page_size, after = page_request(
+                "study_page", filters=(student, f_subject, f_chapter, f_book, f_start_date, f_end_date)
+            )
+        with plans_box:
+            st.markdown("### Study Plans")
+            plan_page_size, plan_after = page_request(
+                "plan_page", filters=(student, f_subject, f_chapter, f_start_date, f_end_date)
+            )
 
-def main():
-    st.markdown("""
-    <div style='background: linear-gradient(90deg, #667eea, #764ba2); padding: 1rem; border-radius: 10px; text-align: center; color: white; margin-bottom: 1rem;'>
-        <h1>📚 CBSE Class 10 Study Tracker - Priyanshi C. Patel</h1>
-        <p>Track your daily studies, plans, and exam performances</p>
-    </div>
-    """, unsafe_allow_html=True)
+        # Filters are applied by the database; only matching rows and displayed
+        # fields of the records page are fetched. Without a book filter Planned vs
+        # Actual is read from the daily rollups; plans have no book, so that filter
+        # needs the raw records.
+        calls = {
+            "rollups": lambda: get_daily_rollups(
+                student, subjects=f_subject, chapters=f_chapter, start_date=f_start_date, end_date=f_end_date
+            ),
+            "page": lambda: get_study_records_page(
+                student, subjects=f_subject, chapters=f_chapter, book_materials=f_book,
+                start_date=f_start_date, end_date=f_end_date, fields=STUDY_FIELDS,
+                page_size=page_size, after=after
+            ),
+            "plans_page": lambda: get_study_plans_page(
+                student, subjects=f_subject, chapters=f_chapter,
+                start_date=f_start_date, end_date=f_end_date, fields=PLAN_FIELDS,
+                page_size=plan_page_size, after=plan_after
+            ),
+            "pending_records": lambda: get_pending_writes(student, "study_records", fields=STUDY_FIELDS),
+            "pending_plans": lambda: get_pending_writes(student, "study_plans", fields=PLAN_FIELDS),
+        }
+        if f_book:
+            calls["planned_vs_actual"] = lambda: get_planned_vs_actual(
+                student, subjects=f_subject, chapters=f_chapter, book_materials=f_book,
+                start_date=f_start_date, end_date=f_end_date
+            )
+        with timed("dashboard.study.fetch"):
+            data = fetch_all(calls)
+        rollups = data["rollups"]
 
-    tabs = st.tabs([
-        "📝 Add Study Record",
-        "📅 Plan Study",
-        "🎯 Add Exam Result",
-        "📊 Study Dashboard",
-        "📈 Exam Dashboard"
-    ])
-
-    # ========== Add Study Record ==========
-    with tabs[0]:
-        st.header("📝 Add New Study Record")
-        sel_subject = st.selectbox("📖 Subject", options=list(SUBJECT_CHAPTERS.keys()), key="study_subject")
-        with st.form("study_record_form", clear_on_submit=True):
-            chapter = st.selectbox("📑 Chapter", options=SUBJECT_CHAPTERS[sel_subject], key="study_chapter")
-            study_date = st.date_input("📅 Study Date", value=date.today())
-            book_material = st.selectbox("📘 Book/Material Used", options=BOOK_MATERIALS)
-            hours_studied = st.number_input("⏰ Hours Studied", min_value=0.0, max_value=24.0, step=0.5)
-            remarks = st.text_area("💭 Remarks (Optional)", max_chars=250)
-            submitted = st.form_submit_button("Add Study Record")
-            if submitted:
-                if hours_studied > 0:
-                    try:
-                        add_study_record(str(study_date), sel_subject, chapter, book_material, hours_studied, remarks)
-                        st.success("Study record added successfully!")
-                        st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"Failed to add study record: {e}")
-                else:
-                    st.error("Please enter valid hours studied (> 0).")
-
-    # ========== Plan Study ==========
-    with tabs[1]:
-        st.header("📅 Plan a Study Session")
-        plan_subject = st.selectbox("📖 Subject", options=list(SUBJECT_CHAPTERS.keys()), key="plan_subject")
-        with st.form("study_plan_form", clear_on_submit=True):
-            plan_chapter = st.selectbox("📑 Chapter", options=SUBJECT_CHAPTERS[plan_subject], key="plan_chapter")
-            plan_date = st.date_input("📅 Plan Date", value=date.today())
-            planned_hours = st.number_input("⏰ Planned Hours", min_value=0.0, max_value=24.0, step=0.5)
-            plan_remarks = st.text_area("💭 Notes/Remarks (Optional)", max_chars=250)
-            submitted = st.form_submit_button("Add Study Plan")
-            if submitted:
-                if planned_hours > 0:
-                    try:
-                        add_study_plan(str(plan_date), plan_subject, plan_chapter, planned_hours, plan_remarks)
-                        st.success("Study plan added successfully!")
-                        st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"Failed to add study plan: {e}")
-                else:
-                    st.error("Please enter valid planned hours (> 0).")
-
-    # ========== Add Exam Result ==========
-    with tabs[2]:
-        st.header("🎯 Add New Exam Result")
-        with st.form("exam_result_form", clear_on_submit=True):
-            exam_subject = st.selectbox("📖 Subject", options=list(SUBJECT_CHAPTERS.keys()), key="exam_subject")
-            exam_type = st.selectbox("🏆 Exam Type", options=EXAM_TYPES)
-            exam_date = st.date_input("📅 Exam Date", value=date.today())
-            col1, col2 = st.columns(2)
-            with col1:
-                maximum_marks = st.number_input("📊 Maximum Marks", min_value=1, max_value=1000, value=100, step=1, key="maximum_marks")
-            with col2:
-                marks_scored = st.number_input("✏️ Marks Scored", min_value=0, max_value=1000, value=0, step=1, key="marks_scored")
-            improvements = st.text_area("🎯 Areas for Improvement (Optional)")
-            submitted = st.form_submit_button("Add Exam Result")
-            if submitted:
-                if marks_scored > maximum_marks:
-                    st.error("Marks scored cannot be more than maximum marks!")
-                else:
-                    try:
-                        add_exam_record(str(exam_date), exam_subject, exam_type, maximum_marks, marks_scored, improvements)
-                        st.success("Exam result added successfully!")
-                        st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"Failed to add exam record: {e}")
-
-    # ========== Study Dashboard ==========
-    with tabs[3]:
-        st.header("📊 Study Dashboard")
-        df = get_study_records()
-        plan_df = get_study_plans()
-
-        if df.empty and plan_df.empty:
-            st.info("No study or plan records found yet.")
-        else:
-            # Safe sets for filters to avoid KeyErrors
-            subj_set_study = set(df['subject']) if 'subject' in df.columns else set()
-            subj_set_plan = set(plan_df['subject']) if 'subject' in plan_df.columns else set()
-            subj_set = subj_set_study.union(subj_set_plan)
-
-            chap_set_study = set(df['chapter']) if 'chapter' in df.columns else set()
-            chap_set_plan = set(plan_df['chapter']) if 'chapter' in plan_df.columns else set()
-            chap_set = chap_set_study.union(chap_set_plan)
-
-            book_set = set(df['book_material']) if 'book_material' in df.columns else set()
-
-            with st.expander("Filters", expanded=True):
-                f_subject = st.multiselect("Subject", options=sorted(subj_set), key="filter_subject")
-                f_chapter = st.multiselect("Chapter", options=sorted(chap_set), key="filter_chapter")
-                f_book = st.multiselect("Book/Material Used", options=sorted(book_set), key="filter_book")
-                start_date_col, end_date_col = st.columns(2)
-                f_start_date = start_date_col.date_input("Start Date", value=None, key="filter_start_date")
-                f_end_date = end_date_col.date_input("End Date", value=None, key="filter_end_date")
-
-            # Filter study records based on selections
-            if f_subject:
-                df = df[df['subject'].isin(f_subject)]
-                plan_df = plan_df[plan_df['subject'].isin(f_subject)]
-            if f_chapter:
-                df = df[df['chapter'].isin(f_chapter)]
-                plan_df = plan_df[plan_df['chapter'].isin(f_chapter)]
-            if f_book:
-                df = df[df['book_material'].isin(f_book)]
-            if f_start_date:
-                df = df[pd.to_datetime(df['date']) >= pd.to_datetime(f_start_date)]
-                plan_df = plan_df[pd.to_datetime(plan_df['plan_date']) >= pd.to_datetime(f_start_date)]
-            if f_end_date:
-                df = df[pd.to_datetime(df['date']) <= pd.to_datetime(f_end_date)]
-                plan_df = plan_df[pd.to_datetime(plan_df['plan_date']) <= pd.to_datetime(f_end_date)]
-
-            # Convert dates to datetime
-            if not df.empty:
-                df['date'] = pd.to_datetime(df['date'])
-            if not plan_df.empty:
-                plan_df['plan_date'] = pd.to_datetime(plan_df['plan_date'])
-
-            # Planned vs Actual aggregate table
+        # Planned vs Actual aggregate table
+        with planned_box:
             st.subheader("Planned vs Actual Study Hours")
-            planned_agg = plan_df.groupby(['plan_date', 'subject', 'chapter']).agg({'planned_hours': 'sum'}).reset_index()
-            actual_agg = df.groupby(['date', 'subject', 'chapter']).agg({'hours_studied': 'sum'}).reset_index()
-            merged = pd.merge(planned_agg, actual_agg,
-                              left_on=['plan_date', 'subject', 'chapter'],
-                              right_on=['date', 'subject', 'chapter'],
-                              how='outer')
-            merged['plan_date'] = merged['plan_date'].fillna(merged['date'])
-            merged['planned_hours'] = merged['planned_hours'].fillna(0)
-            merged['hours_studied'] = merged['hours_studied'].fillna(0)
+            if f_book:
+                merged = data["planned_vs_actual"]
+            else:
+                merged = rollups.rename(columns={'day': 'date', 'studied_hours': 'hours_studied'})[
+                    ['date', 'subject', 'chapter', 'planned_hours', 'hours_studied']
+                ].sort_values(['date', 'subject', 'chapter'], ascending=[False, True, True], ignore_index=True)
             merged = merged.rename(columns={
-                'plan_date': 'Date',
+                'date': 'Date',
                 'subject': 'Subject',
                 'chapter': 'Chapter',
                 'planned_hours': 'Planned Hours',
                 'hours_studied': 'Actual Hours'
             })
-            merged = merged[['Date', 'Subject', 'Chapter', 'Planned Hours', 'Actual Hours']].sort_values('Date', ascending=False)
-            st.dataframe(merged, use_container_width=True)
+            with timed("dashboard.study.planned_vs_actual.render"):
+                st.dataframe(merged, use_container_width=True)
 
-            # Show study records table
-            st.markdown("### Study Records")
+        # Weekly/monthly totals and trends, summed from the daily rollups
+        with trends_box:
+            st.subheader("Study Trends")
+            if f_book:
+                st.caption("Trends are not split by book/material; that filter is ignored here.")
+            period = st.radio("Period", options=list(PERIODS), index=1, horizontal=True, key="study_trend_period")
+            with timed("dashboard.study.trends"):
+                totals = period_totals(rollups, PERIODS[period])
+            if totals.empty:
+                st.info("No study or plan records in this range.")
+            else:
+                with timed("dashboard.study.trends.render"):
+                    st.plotly_chart(px.line(
+                        totals, x="period", y="studied_hours", color="subject", markers=True,
+                        labels={"period": period, "studied_hours": "Hours Studied", "subject": "Subject"},
+                    ), use_container_width=True)
+                    st.dataframe(
+                        totals[["period", "subject", "planned_hours", "studied_hours", "study_count"]].rename(columns={
+                            "period": period, "subject": "Subject", "planned_hours": "Planned Hours",
+                            "studied_hours": "Actual Hours", "study_count": "Sessions",
+                        }),
+                        use_container_width=True, hide_index=True
+                    )
+
+        # Show study records table, one page at a time
+        with records_box:
+            render_pending("study records", data["pending_records"])
+            df, next_cursor = data["page"]
             display_df = df.copy()
             # Rename MongoDB _id to ID for display
             if '_id' in display_df.columns:
                 display_df = display_df.rename(columns={'_id': 'ID'})
-            st.dataframe(
-                display_df[['ID', 'date', 'subject', 'chapter', 'book_material', 'hours_studied', 'remarks']],
-                use_container_width=True
+            with timed("dashboard.study.records.render"):
+                selected = render_table(
+                    "study_records_table",
+                    display_df[['ID', 'date', 'subject', 'chapter', 'book_material', 'hours_studied', 'remarks']]
+                )
+            page_controls("study_page", next_cursor)
+            render_selection_delete(student, "study records", "delete_study_selected", delete_study_records, selected)
+            render_filter_delete(
+                student, "study records", "delete_study_filtered", delete_study_records,
+                subjects=f_subject, chapters=f_chapter, book_materials=f_book,
+                start_date=f_start_date, end_date=f_end_date
             )
 
-            # Record deletion input and button
-            st.markdown("### Delete a Study Record")
-            del_id = st.text_input("Enter Study Record ID to delete (copy from ID column above)", key="del_study_id")
-            if st.button("Delete Study Record"):
-                if del_id:
-                    try:
-                        delete_study_record(del_id)
-                        st.success(f"Deleted study record ID: {del_id}")
-                        st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"Error deleting record: {e}")
-                else:
-                    st.error("Please enter a valid Study Record ID")
-
-    # ========== Exam Dashboard ==========
-    with tabs[4]:
-        st.header("📈 Exam Dashboard")
-        exam_df = get_exam_records()
-
-        if exam_df.empty:
-            st.info("No exam records found.")
-        else:
-            with st.expander("Filters", expanded=True):
-                f_subject_exam = st.multiselect("Subject", options=sorted(exam_df['subject'].unique()), key="filter_exam_subject")
-                f_exam_type = st.multiselect("Exam Type", options=sorted(exam_df['exam_type'].unique()), key="filter_exam_type")
-                start_exam_col, end_exam_col = st.columns(2)
-                start_exam_date = start_exam_col.date_input("Exam Start Date", value=None, key="filter_exam_start_date")
-                end_exam_date = end_exam_col.date_input("Exam End Date", value=None, key="filter_exam_end_date")
-
-            if f_subject_exam:
-                exam_df = exam_df[exam_df['subject'].isin(f_subject_exam)]
-            if f_exam_type:
-                exam_df = exam_df[exam_df['exam_type'].isin(f_exam_type)]
-            if start_exam_date:
-                exam_df = exam_df[pd.to_datetime(exam_df['exam_date']) >= pd.to_datetime(start_exam_date)]
-            if end_exam_date:
-                exam_df = exam_df[pd.to_datetime(exam_df['exam_date']) <= pd.to_datetime(end_exam_date)]
-
-            # Convert exam_date
-            exam_df['exam_date'] = pd.to_datetime(exam_df['exam_date'])
-
-            display = exam_df.copy()
-            if '_id' in display.columns:
-                display.rename(columns={'_id':'ID'}, inplace=True)
-
-            display['percentage'] = ((display['marks_scored'] / display['maximum_marks'])*100).round(1).astype(str) + '%'
-
-            display = display[['ID','exam_date','subject','exam_type','marks_scored','maximum_marks','percentage','improvements']]
-            display.rename(columns={
-                'exam_date': 'Exam Date',
-                'subject': 'Subject',
-                'exam_type': 'Exam Type',
-                'marks_scored':'Marks',
-                'maximum_marks':'Max',
-                'improvements':'Improvement'
-            }, inplace=True)
-
-            st.dataframe(display, use_container_width=True)
-
-    st.markdown("### Delete an Exam Record")
-del_exam_id = st.text_input(
-    "Enter Exam Record ID to delete (copy from ID column above)",
-    key="del_exam_id"
-)
-if st.button("Delete Exam Record"):
-    if del_exam_id:
-        try:
-            delete_exam_record(del_exam_id)
-            st.success(f"Deleted exam record ID: {del_exam_id}")
-            st.experimental_rerun()
-        except Exception as e:
-            st.error(f"Error deleting exam record: {e}")
+        # Study plans, deleted the same way; plans have no book/material
+        with plans_box:
+            render_pending("study plans", data["pending_plans"])
+            plans, next_plan_cursor = data["plans_page"]
+            with timed("dashboard.study.plans.render"):
+                selected_plans = render_table(
+                    "study_plans_table",
+                    plans.rename(columns={'_id': 'ID'})[['ID', *PLAN_FIELDS]]
+                )
+            page_controls("plan_page", next_plan_cursor)
+            render_selection_delete(student, "study plans", "delete_plan_selected", delete_study_plans, selected_plans)
+            render_filter_delete(
+                student, "study plans", "delete_plan_filtered", delete_study_plans,
+                subjects=f_subject, chapters=f_chapter, start_date=f_start_date, end_date=f_end_date
+            )
+
+def render_exam_dashboard(student):
+    import plotly.express as px
+    from datetime import timedelta
+    from analytics import (
+        PERIODS, effort_correlation, exam_percentage, exam_type_trends, rolling_scores, study_before_exams
+    )
+
+    st.header("📈 Exam Dashboard")
+    with timed("dashboard.exam.filter_options"):
+        options = fetch_all({
+            field: (lambda f=field: get_distinct_values(student, "exam_records", f)) for field in ("subject", "exam_type")
+        })
+    exam_subjects = options["subject"]
+
+    if not exam_subjects:
+        st.info("No exam records found.")
     else:
-        st.error("Please enter a valid Exam Record ID")
+        with st.expander("Filters", expanded=True):
+            f_subject_exam = st.multiselect("Subject", options=exam_subjects, key="filter_exam_subject")
+            f_exam_type = st.multiselect("Exam Type", options=options["exam_type"], key="filter_exam_type")
+            start_exam_col, end_exam_col = st.columns(2)
+            start_exam_date = start_exam_col.date_input("Exam Start Date", value=None, key="filter_exam_start_date")
+            end_exam_date = end_exam_col.date_input("Exam End Date", value=None, key="filter_exam_end_date")
+            window_col, days_col = st.columns(2)
+            rolling_window = window_col.slider("Rolling average over (exam days)", 1, 10, 3, key="exam_rolling_window")
+            study_days = days_col.slider("Study hours counted before an exam (days)", 1, 60, 14, key="exam_study_days")
+
+        page_size, after = page_request(
+            "exam_page", filters=(student, f_subject_exam, f_exam_type, start_exam_date, end_exam_date)
+        )
+        with timed("dashboard.exam.fetch"):
+            data = fetch_all({
+                "page": lambda: get_exam_records_page(
+                    student, subjects=f_subject_exam, exam_types=f_exam_type,
+                    start_date=start_exam_date, end_date=end_exam_date, fields=EXAM_FIELDS,
+                    page_size=page_size, after=after
+                ),
+                "rollups": lambda: get_exam_rollups(
+                    student, subjects=f_subject_exam, exam_types=f_exam_type,
+                    start_date=start_exam_date, end_date=end_exam_date
+                ),
+                "pending": lambda: get_pending_writes(student, "exam_records", fields=EXAM_FIELDS),
+                # Study hours from before the first exam in range count towards it
+                "study_rollups": lambda: get_daily_rollups(
+                    student, subjects=f_subject_exam,
+                    start_date=start_exam_date - timedelta(days=study_days) if start_exam_date else None,
+                    end_date=end_exam_date
+                ),
+            })
+        render_pending("exam results", data["pending"])
+        exam_df, next_cursor = data["page"]
+
+        display = exam_df.copy()
+        if '_id' in display.columns:
+            display.rename(columns={'_id':'ID'}, inplace=True)
+
+        with timed("dashboard.exam.percentage"):
+            display['percentage'] = exam_percentage(display)
+
+        display = display[['ID','exam_date','subject','exam_type','marks_scored','maximum_marks','percentage','improvements']]
+        display.rename(columns={
+            'exam_date': 'Exam Date',
+            'subject': 'Subject',
+            'exam_type': 'Exam Type',
+            'marks_scored':'Marks',
+            'maximum_marks':'Max',
+            'percentage': 'Score',
+            'improvements':'Improvement'
+        }, inplace=True)
+
+        with timed("dashboard.exam.records.render"):
+            selected = render_table("exam_records_table", display,
+                                    column_config={"Score": st.column_config.NumberColumn(format="%.1f%%")})
+        page_controls("exam_page", next_cursor)
+        render_selection_delete(student, "exam records", "delete_exam_selected", delete_exam_records, selected)
+        render_filter_delete(
+            student, "exam records", "delete_exam_filtered", delete_exam_records,
+            subjects=f_subject_exam, exam_types=f_exam_type, start_date=start_exam_date, end_date=end_exam_date
+        )
+
+        exam_rollups = data["rollups"]
+        if exam_rollups.empty:
+            st.info("No exams in this range.")
+        else:
+            # Per-subject score with its rolling average, from the exam rollups
+            st.subheader("Score Trend")
+            with timed("dashboard.exam.rolling"):
+                scores = rolling_scores(exam_rollups, rolling_window)
+            with timed("dashboard.exam.rolling.render"):
+                st.plotly_chart(px.line(
+                    scores, x="day", y="rolling_percentage", color="subject", markers=True,
+                    hover_data={"percentage": ":.1f"},
+                    labels={"day": "Exam Date", "rolling_percentage": f"Score % (last {rolling_window} exam days)",
+                            "subject": "Subject", "percentage": "Score %"},
+                ), use_container_width=True)
+
+            st.subheader("Score by Exam Type")
+            period = st.radio("Period", options=list(PERIODS), index=2, horizontal=True, key="exam_trend_period")
+            with timed("dashboard.exam.trends"):
+                trends = exam_type_trends(exam_rollups, PERIODS[period])
+            with timed("dashboard.exam.trends.render"):
+                st.plotly_chart(px.line(
+                    trends, x="period", y="percentage", color="exam_type", markers=True,
+                    labels={"period": period, "percentage": "Score %", "exam_type": "Exam Type"},
+                ), use_container_width=True)
+
+            # Hours studied in the days before each exam against its score
+            st.subheader("Study Hours vs Score")
+            by_chapter = st.checkbox("Break down by chapter", key="exam_effort_by_chapter")
+            by = ("subject", "chapter") if by_chapter else ("subject",)
+            with timed("dashboard.exam.effort"):
+                pairs = study_before_exams(exam_rollups, data["study_rollups"], study_days, by)
+                correlation = effort_correlation(pairs, by)
+            with timed("dashboard.exam.effort.render"):
+                if not by_chapter:
+                    st.plotly_chart(px.scatter(
+                        pairs, x="hours_before", y="percentage", color="subject",
+                        hover_data={"day": True},
+                        labels={"hours_before": f"Hours studied in the {study_days} days before",
+                                "percentage": "Score %", "subject": "Subject", "day": "Exam Date"},
+                    ), use_container_width=True)
+                st.caption("Correlation runs from -1 to 1; it is left empty for fewer than three exams "
+                           "or when hours or scores never vary.")
+                st.dataframe(
+                    correlation.round({"average_hours": 1, "average_percentage": 1, "correlation": 2}).rename(columns={
+                        "subject": "Subject", "chapter": "Chapter", "exams": "Exam Days",
+                        "average_hours": "Average Hours Before", "average_percentage": "Average Score %",
+                        "correlation": "Correlation",
+                    }),
+                    use_container_width=True, hide_index=True
+                )
+
+def render_class_overview(student):
+    import plotly.express as px
+
+    st.header("🏫 Class Overview")
+    with st.expander("Filters", expanded=True):
+        students = st.multiselect("Students (all if empty)", options=get_students(), key="class_students")
+        subjects = st.multiselect("Subject", options=list(SUBJECT_CHAPTERS), key="class_subjects")
+        start_col, end_col = st.columns(2)
+        start_date = start_col.date_input("Start Date", value=None, key="class_start_date")
+        end_date = end_col.date_input("End Date", value=None, key="class_end_date")
+
+    # Class totals are grouped by the database from the rollups
+    with timed("dashboard.class.fetch"):
+        data = fetch_all({
+            "class": lambda: get_class_summary(
+                student_ids=students, subjects=subjects, start_date=start_date, end_date=end_date
+            ),
+            "student": lambda: get_class_summary(
+                student_ids=[student], subjects=subjects, start_date=start_date, end_date=end_date
+            ),
+        })
+    summary = data["class"]
+    if summary.empty:
+        st.info("No records for these students in this range.")
+        return
+
+    st.dataframe(
+        summary.round({"planned_hours": 1, "studied_hours": 1, "hours_per_student": 1, "average_percentage": 1})
+        .rename(columns={
+            "subject": "Subject", "students": "Students", "planned_hours": "Planned Hours",
+            "studied_hours": "Actual Hours", "hours_per_student": "Hours per Student",
+            "exam_students": "Students with Exams", "exams": "Exams", "average_percentage": "Average Score %",
+        }),
+        use_container_width=True, hide_index=True
+    )
+
+    # The selected student against the class, per subject
+    mine = data["student"].set_index("subject")
+    comparison = summary.set_index("subject")[["hours_per_student", "average_percentage"]].assign(
+        student_hours=mine["studied_hours"], student_percentage=mine["average_percentage"]
+    ).astype("float64").reset_index()
+    hours_col, score_col = st.columns(2)
+    with timed("dashboard.class.render"):
+        hours_col.plotly_chart(px.bar(
+            comparison, x="subject", y=["hours_per_student", "student_hours"], barmode="group",
+            labels={"subject": "Subject", "value": "Hours", "variable": ""},
+            title=f"Hours studied: class average vs {student}",
+        ), use_container_width=True)
+        score_col.plotly_chart(px.bar(
+            comparison, x="subject", y=["average_percentage", "student_percentage"], barmode="group",
+            labels={"subject": "Subject", "value": "Score %", "variable": ""},
+            title=f"Exam score: class average vs {student}",
+        ), use_container_width=True)
+
+# Sections of the app in navigation order. Only the selected one runs, so the
+# other sections' data is never fetched.
+SECTIONS = {
+    "📝 Add Study Record": render_add_study_record,
+    "📅 Plan Study": render_plan_study,
+    "🎯 Add Exam Result": render_add_exam_result,
+    "📊 Study Dashboard": render_study_dashboard,
+    "📈 Exam Dashboard": render_exam_dashboard,
+    "🏫 Class Overview": render_class_overview,
+}
+
+@timed("app.rerun")
+def main():
+    start_run()
+    # The previous rerun's selection; the sidebar picker below can change it
+    student = html.escape(current_student())
+    st.markdown(f"""
+    <div style='background: linear-gradient(90deg, #667eea, #764ba2); padding: 1rem; border-radius: 10px; text-align: center; color: white; margin-bottom: 1rem;'>
+        <h1>📚 CBSE Class 10 Study Tracker - {student}</h1>
+        <p>Track your daily studies, plans, and exam performances</p>
+    </div>
+    """, unsafe_allow_html=True)
+    # The header is sent before the backend is imported or connected
+    record_startup("app.first_paint", time.perf_counter() - _RUN_STARTED)
+
+    start_metrics_server()
+    # Indexes and date migration run once per server process
+    init_db()
+
+    student = render_student_picker()
+    render_export_panel(student)
+    render_import_panel(student)
 
+    section = st.radio("Section", options=list(SECTIONS), horizontal=True,
+                       label_visibility="collapsed", key="section")
+    show_saved_message()
+    with timed("app.section"):
+        SECTIONS[section](student)
 
+    render_performance_panel()
+    record_startup("app.script", time.perf_counter() - _RUN_STARTED)
 
+if __name__ == "__main__":
+    main()
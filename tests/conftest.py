@@ -0,0 +1,9 @@
+# conftest.py
+#
+# Tests import the app modules from the repository root, like the benchmarks.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
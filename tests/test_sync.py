@@ -0,0 +1,70 @@
+# test_sync.py
+#
+# Incremental sync against mongomock (no change streams, so the watermark
+# and tombstone path): each student's local copy only holds and fetches that
+# student's documents.
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import mongo_connector as mc
+
+@pytest.fixture(autouse=True)
+def incremental_mode(monkeypatch):
+    monkeypatch.setattr(mc, "WRITE_MODE", "direct")
+    monkeypatch.setattr(mc, "SYNC_MODE", "incremental")
+    monkeypatch.setattr(mc, "_client", mongomock.MongoClient())
+    monkeypatch.setattr(mc, "_db_initialised", False)
+    monkeypatch.setattr(mc, "_change_streams_supported", False)
+    mc._sync_state.clear()
+    mc.invalidate_cache()
+    mc.init_db()
+    yield
+    mc._sync_state.clear()
+    mc.invalidate_cache()
+
+def add_record(student_id, day, hours=1.0):
+    mc.add_study_record(student_id, f"2024-01-{day:02d}", "Maths", "Algebra", "NCERT", hours, "")
+
+def local_ids(student_id):
+    return set(mc._sync_state[("study_records", student_id)]["frame"]["_id"])
+
+def test_local_copy_holds_only_the_students_documents():
+    add_record("amy", 1)
+    add_record("bob", 2)
+    assert len(mc.get_study_records("amy")) == 1
+    add_record("bob", 3)
+    add_record("amy", 4)
+
+    assert len(mc.get_study_records("amy")) == 2
+    assert ("study_records", "bob") not in mc._sync_state
+    assert local_ids("amy") == set(mc.get_study_records("amy")["_id"])
+    assert len(mc.get_study_records("bob")) == 2
+
+def test_delete_reaches_only_the_owners_copy():
+    add_record("amy", 1)
+    add_record("bob", 2)
+    amy_id = mc.get_study_records("amy")["_id"][0]
+    assert len(mc.get_study_records("bob")) == 1
+
+    mc.delete_study_record("amy", amy_id)
+    assert mc.get_study_records("amy").empty
+    assert len(mc.get_study_records("bob")) == 1
+
+def test_rewrite_reloads_every_students_copy():
+    add_record("amy", 1)
+    add_record("bob", 2)
+    mc.get_study_records("amy")
+    mc.get_study_records("bob")
+
+    mc._records_rewritten("study_records")
+    assert not [key for key in mc._sync_state if key[0] == "study_records"]
+    assert len(mc.get_study_records("amy")) == 1
+
+def test_reads_do_not_modify_the_local_copy():
+    add_record("amy", 1, hours=2.0)
+    records = mc.get_study_records("amy")
+    records["hours_studied"] = 0.0
+    assert mc.get_distinct_values("amy", "study_records", "subject") == ["Maths"]
+    assert mc.get_study_records("amy")["hours_studied"].tolist() == [2.0]
@@ -0,0 +1,142 @@
+# test_write_behind.py
+#
+# Write-behind journal against mongomock: each entry's state (queued, inserted,
+# counted) must let a retry finish the job without missing or double counting
+# rollups, and documents written late must still reach incremental sync.
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+from bson.objectid import ObjectId
+from pymongo.errors import AutoReconnect
+
+import mongo_connector as mc
+import write_behind as wb
+
+STUDENT = "amy"
+
+@pytest.fixture(autouse=True)
+def write_behind_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(wb, "JOURNAL_PATH", str(tmp_path / "journal.db"))
+    monkeypatch.setattr(wb, "_local", threading.local())
+    # No background thread; the tests call flush() themselves
+    monkeypatch.setattr(wb, "_worker", object())
+    monkeypatch.setattr(wb, "_in_flight", set())
+    monkeypatch.setattr(mc, "WRITE_MODE", "write_behind")
+    monkeypatch.setattr(mc, "SYNC_MODE", "off")
+    monkeypatch.setattr(mc, "_client", mongomock.MongoClient())
+    monkeypatch.setattr(mc, "_db_initialised", False)
+    monkeypatch.setattr(mc, "_change_streams_supported", False)
+    mc._sync_state.clear()
+    mc.invalidate_cache()
+    mc.init_db()
+    wb.start(mc.write_documents, mc.count_documents, mc.remove_documents)
+    yield
+    mc._sync_state.clear()
+    mc.invalidate_cache()
+
+def add_record(day=5, hours=2.0):
+    mc.add_study_record(STUDENT, f"2024-01-{day:02d}", "Maths", "Algebra", "NCERT", hours, "")
+    return wb.get_pending("study_records")[-1]["_id"]
+
+def retry_now():
+    conn = wb.get_connection()
+    with conn:
+        conn.execute("UPDATE pending_writes SET next_attempt = 0")
+
+def daily_rollups():
+    rows = mc.get_client()[mc.DB_NAME][mc.DAILY_ROLLUPS].find({}, {"_id": 0})
+    # $inc and a rebuild differ only in which zero measures a row carries
+    return sorted(tuple(sorted((k, v) for k, v in row.items() if v != 0)) for row in rows)
+
+def assert_rollups_match_records():
+    counted = daily_rollups()
+    mc.rebuild_rollups()
+    assert counted == daily_rollups()
+
+def test_insert_with_lost_reply_is_counted_on_retry(monkeypatch):
+    add_record()
+
+    def lost_reply(collection_name, docs):
+        mc.write_documents(collection_name, docs)
+        raise AutoReconnect("reply lost")
+
+    monkeypatch.setattr(wb, "_writer", (lost_reply, mc.count_documents, mc.remove_documents))
+    assert wb.flush() == 0
+    monkeypatch.setattr(wb, "_writer", (mc.write_documents, mc.count_documents, mc.remove_documents))
+    retry_now()
+
+    # The retry gets DUPLICATE_KEY, which must not skip the rollups
+    assert wb.flush() == 1
+    assert wb.get_status()["pending"] == 0
+    assert daily_rollups() != []
+    assert_rollups_match_records()
+
+def test_rollup_update_with_lost_reply_is_recounted_not_doubled(monkeypatch):
+    add_record()
+    update_rollups = mc._update_rollups
+    failures = []
+
+    def applied_then_lost(*args, **kwargs):
+        update_rollups(*args, **kwargs)
+        if not failures:
+            failures.append(True)
+            raise AutoReconnect("reply lost")
+
+    monkeypatch.setattr(mc, "_update_rollups", applied_then_lost)
+    assert wb.flush() == 0
+    retry_now()
+    assert wb.flush() == 1
+    assert_rollups_match_records()
+
+def test_discard_during_flush_deletes_the_written_document(monkeypatch):
+    record_id = add_record()
+    discarded = []
+
+    def write_then_discard(collection_name, docs):
+        failed = mc.write_documents(collection_name, docs)
+        discarded.append(wb.discard(record_id, STUDENT))
+        return failed
+
+    monkeypatch.setattr(wb, "_writer", (write_then_discard, mc.count_documents, mc.remove_documents))
+    wb.flush()
+
+    assert discarded == [True]
+    assert wb.get_status()["pending"] == 0
+    assert mc.get_collection("study_records").count_documents({"_id": record_id}) == 0
+    assert mc.get_collection(mc.TOMBSTONES).count_documents({"record_id": record_id}) == 1
+    assert daily_rollups() == []
+
+def test_discard_of_queued_document_never_writes_it():
+    record_id = add_record()
+    assert wb.discard(record_id, "someone-else") is False
+    assert wb.discard(record_id, STUDENT) is True
+    assert wb.flush() == 0
+    assert mc.get_collection("study_records").count_documents({}) == 0
+
+def test_late_write_reaches_watermark_sync(monkeypatch):
+    monkeypatch.setattr(mc, "SYNC_MODE", "incremental")
+    record_id = add_record()
+
+    def outage(collection_name, docs):
+        raise AutoReconnect("server unreachable")
+
+    monkeypatch.setattr(wb, "_writer", (outage, mc.count_documents, mc.remove_documents))
+    assert wb.flush() == 0
+
+    # A newer document is synced first, moving the watermark past the queued _id
+    newer = datetime.now() + timedelta(minutes=5)
+    mc.get_collection("study_records").insert_one({
+        "_id": ObjectId.from_datetime(newer), mc.STUDENT_FIELD: STUDENT, "date": datetime(2024, 1, 6),
+        "subject": "Maths", "chapter": "Algebra", "book_material": "NCERT", "hours_studied": 1.0, "remarks": "",
+    })
+    assert len(mc.get_study_records(STUDENT)) == 1
+
+    monkeypatch.setattr(wb, "_writer", (mc.write_documents, mc.count_documents, mc.remove_documents))
+    retry_now()
+    assert wb.flush() == 1
+    ids = set(mc.get_study_records(STUDENT)["_id"])
+    assert str(record_id) in ids and len(ids) == 2
@@ -0,0 +1,308 @@
+# write_behind.py
+#
+# Optional write-behind journal for new MongoDB records. add_* calls append
+# the document to a local SQLite journal and return at once; a background
+# worker inserts journaled documents into MongoDB in batches and retries with
+# backoff when the server cannot be reached. Every document carries the
+# ObjectId it will be stored under, so a batch that is retried after a partial
+# write cannot create duplicates. Each journal entry records how far it got
+# (inserted, counted into the rollups), so a retry repeats only the steps
+# whose outcome is not known.
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from bson import json_util
+
+from instrumentation import timed
+
+# ---- CONFIGURATION ----
+JOURNAL_PATH = os.environ.get(
+    "STUDY_TRACKER_JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "write_journal.db"),
+)
+# Documents sent per insert_many
+FLUSH_BATCH_SIZE = 100
+# The worker also wakes up this often to retry failed batches
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("STUDY_TRACKER_FLUSH_INTERVAL", "2"))
+# Retry delays double per failed attempt up to this limit
+MAX_BACKOFF_SECONDS = 300
+
+# Journal entry states: not yet known to be in MongoDB, inserted but not in
+# the rollups, inserted and counted
+QUEUED = 0
+INSERTED = 1
+COUNTED = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_writes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    record_id TEXT NOT NULL UNIQUE,
+    document TEXT NOT NULL,
+    queued_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    state INTEGER NOT NULL DEFAULT 0,
+    recount INTEGER NOT NULL DEFAULT 0,
+    discarded INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns added to journals created before them
+MIGRATIONS = {
+    "state": "ALTER TABLE pending_writes ADD COLUMN state INTEGER NOT NULL DEFAULT 0",
+    "recount": "ALTER TABLE pending_writes ADD COLUMN recount INTEGER NOT NULL DEFAULT 0",
+    "discarded": "ALTER TABLE pending_writes ADD COLUMN discarded INTEGER NOT NULL DEFAULT 0",
+}
+
+logger = logging.getLogger("study_tracker.write_behind")
+
+_local = threading.local()
+_start_lock = threading.Lock()
+# Serialises flushes and rollup rebuilds; held while a batch is sent to MongoDB
+_flush_lock = threading.RLock()
+# Held briefly around journal bookkeeping that must not race discard()
+_journal_lock = threading.Lock()
+# record_ids of the batch being flushed
+_in_flight = set()
+# Bumped by recounting(), so a flush stops using the states it read
+_recounts = 0
+_wake = threading.Event()
+_writer = None
+_worker = None
+
+# ---- JOURNAL ----
+
+def get_connection():
+    """Return this thread's journal connection; commits are fsynced (synchronous=FULL)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(JOURNAL_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(pending_writes)")}
+        with conn:
+            for column, sql in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(sql)
+        _local.conn = conn
+    return conn
+
+def enqueue(collection_name, doc):
+    """Durably journal doc (which must have its _id) and wake the worker."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO pending_writes (collection, record_id, document, queued_at) VALUES (?, ?, ?, ?)",
+            (collection_name, str(doc["_id"]), json_util.dumps(doc), datetime.now().isoformat(sep=" ")),
+        )
+    _wake.set()
+
+def discard(record_id, student_id=None):
+    """Remove a journaled document before it is written. Returns True if it was pending.
+
+    With student_id, only a document belonging to that student is removed.
+    A document in the batch being flushed may already be in MongoDB, so it is
+    only marked; the worker deletes it again once its write has finished.
+    """
+    record_id = str(record_id)
+    where = " WHERE record_id = ? AND discarded = 0"
+    params = (record_id,)
+    if student_id is not None:
+        where += " AND json_extract(document, '$.student_id') = ?"
+        params += (student_id,)
+    conn = get_connection()
+    with _journal_lock, conn:
+        if record_id in _in_flight:
+            cursor = conn.execute("UPDATE pending_writes SET discarded = 1" + where, params)
+        else:
+            cursor = conn.execute("DELETE FROM pending_writes" + where, params)
+    return cursor.rowcount > 0
+
+def get_pending(collection_name=None, student_id=None):
+    """Return the journaled documents, oldest first, optionally for one collection or student."""
+    clauses, params = ["discarded = 0"], []
+    if collection_name:
+        clauses.append("collection = ?")
+        params.append(collection_name)
+    if student_id is not None:
+        clauses.append("json_extract(document, '$.student_id') = ?")
+        params.append(student_id)
+    sql = "SELECT document FROM pending_writes WHERE " + " AND ".join(clauses)
+    rows = get_connection().execute(sql + " ORDER BY seq", params).fetchall()
+    return [json_util.loads(document) for (document,) in rows]
+
+def get_status():
+    """Return the number of pending and retried writes and the latest error."""
+    pending, retrying = get_connection().execute(
+        "SELECT COUNT(*), COALESCE(SUM(attempts > 0), 0) FROM pending_writes"
+    ).fetchone()
+    last_error = get_connection().execute(
+        "SELECT last_error FROM pending_writes WHERE last_error IS NOT NULL ORDER BY seq DESC LIMIT 1"
+    ).fetchone()
+    return {"pending": pending, "retrying": retrying, "last_error": last_error[0] if last_error else None}
+
+# ---- FLUSHING ----
+
+def _retry_later(conn, seqs, error, recount=False):
+    now = time.time()
+    conn.executemany(
+        "UPDATE pending_writes SET attempts = attempts + 1, last_error = ?, recount = MAX(recount, ?), "
+        "next_attempt = ? + MIN(?, (1 << MIN(attempts, 16))) WHERE seq = ?",
+        [(error, int(recount), now, MAX_BACKOFF_SECONDS, seq) for seq in seqs],
+    )
+
+def _set_state(conn, entries, state):
+    with conn:
+        conn.executemany("UPDATE pending_writes SET state = ? WHERE seq = ?", [(state, entry["seq"]) for entry in entries])
+    for entry in entries:
+        entry["state"] = state
+
+def _attempt(conn, collection_name, step, entries, call):
+    # Runs one step for entries and returns whether it succeeded; on an error
+    # the entries are retried later, and since a rollup update or delete may
+    # have reached MongoDB anyway, their rollups are then recounted
+    try:
+        call(collection_name, [entry["doc"] for entry in entries])
+    except Exception as e:
+        logger.warning("Write-behind %s of %s failed: %s", step, collection_name, e)
+        with conn:
+            _retry_later(conn, [entry["seq"] for entry in entries], str(e), recount=step != "insert")
+        return False
+    return True
+
+def _flush_collection(conn, collection_name, entries):
+    insert, count, remove = _writer
+
+    # An _id that is already stored was inserted by an attempt whose reply was
+    # lost; it is in MongoDB but, unlike a COUNTED entry, not in the rollups yet
+    queued = [entry for entry in entries if entry["state"] == QUEUED]
+    failed = {}
+    if queued and _attempt(conn, collection_name, "insert", queued,
+                           lambda name, docs: failed.update(insert(name, docs))):
+        with conn:
+            for entry in queued:
+                if entry["id"] in failed:
+                    _retry_later(conn, [entry["seq"]], failed[entry["id"]])
+        _set_state(conn, [entry for entry in queued if entry["id"] not in failed], INSERTED)
+
+    inserted = [entry for entry in entries if entry["state"] == INSERTED]
+    recount = any(entry["recount"] for entry in inserted)
+    if inserted and _attempt(conn, collection_name, "rollup update", inserted,
+                             lambda name, docs: count(name, docs, recount)):
+        _set_state(conn, inserted, COUNTED)
+
+    counted = [entry for entry in entries if entry["state"] == COUNTED]
+    with _journal_lock, conn:
+        # Entries discarded while in flight stay until they are deleted from MongoDB
+        conn.executemany(
+            "DELETE FROM pending_writes WHERE seq = ? AND discarded = 0", [(entry["seq"],) for entry in counted]
+        )
+        kept = {seq for (seq,) in conn.execute("SELECT seq FROM pending_writes WHERE discarded = 1")}
+    discarded = [entry for entry in counted if entry["seq"] in kept]
+    recount = any(entry["recount"] for entry in discarded)
+    if discarded and _attempt(conn, collection_name, "delete", discarded,
+                              lambda name, docs: remove(name, docs, recount)):
+        with conn:
+            conn.executemany("DELETE FROM pending_writes WHERE seq = ?", [(entry["seq"],) for entry in discarded])
+    return len(counted) - len(discarded)
+
+def flush(limit=FLUSH_BATCH_SIZE):
+    """Write up to limit due documents with the writer functions given to start().
+
+    Per collection, journaled documents are inserted, then counted into the
+    rollups, and the entry is removed; the entry's state records the steps
+    done, so a retry continues after the last one that is known to have
+    succeeded. Returns the number of documents written.
+    """
+    with _flush_lock, timed("write_behind.flush"):
+        conn = get_connection()
+        recounts = _recounts
+        with _journal_lock:
+            rows = conn.execute(
+                "SELECT seq, collection, record_id, document, state, recount FROM pending_writes "
+                "WHERE next_attempt <= ? ORDER BY seq LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+            _in_flight.update(row[2] for row in rows)
+        try:
+            batches = {}
+            for seq, collection_name, record_id, document, state, recount in rows:
+                batches.setdefault(collection_name, []).append({
+                    "seq": seq, "id": record_id, "doc": json_util.loads(document),
+                    "state": state, "recount": recount,
+                })
+            written = 0
+            for collection_name, entries in batches.items():
+                written += _flush_collection(conn, collection_name, entries)
+                if _recounts != recounts:
+                    # The other collections' states changed in the journal
+                    _wake.set()
+                    break
+            return written
+        finally:
+            with _journal_lock:
+                _in_flight.difference_update(row[2] for row in rows)
+
+def _run():
+    while True:
+        _wake.wait(FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+        try:
+            while flush() == FLUSH_BATCH_SIZE:
+                pass
+        except Exception:
+            logger.exception("Write-behind worker error")
+
+@contextmanager
+def recounting(affects=None):
+    """Hold off flushes while rollup rows are recounted from MongoDB's records.
+
+    A recount counts every inserted document under it, so afterwards those
+    inserted entries are marked counted and queued ones, which may have been
+    inserted without a reply, are recounted instead of incremented once they
+    are stored. affects(collection_name, doc) tells whether a document falls
+    under the recount; by default every document does (a full rebuild).
+    """
+    global _recounts
+    with _flush_lock:
+        yield
+        conn = get_connection()
+        with _journal_lock, conn:
+            rows = conn.execute(
+                "SELECT seq, collection, document, state FROM pending_writes WHERE state != ?", (COUNTED,)
+            ).fetchall()
+            updates = {QUEUED: [], INSERTED: []}
+            for seq, collection_name, document, state in rows:
+                if affects is None or affects(collection_name, json_util.loads(document)):
+                    updates[state].append((seq,))
+            conn.executemany(f"UPDATE pending_writes SET state = {COUNTED} WHERE seq = ?", updates[INSERTED])
+            conn.executemany("UPDATE pending_writes SET recount = 1 WHERE seq = ?", updates[QUEUED])
+        _recounts += 1
+
+def start(insert, count, remove):
+    """Set the writer functions and start the background worker, once per process.
+
+    Each takes a collection name and decoded documents: insert(name, docs)
+    stores them and returns [(_id, message)] for documents it could not,
+    treating an _id that is already stored as written; count(name, docs,
+    recount) adds them to the rollups, or rebuilds the rollups when recount
+    is true; remove(name, docs, recount) deletes documents discarded while
+    they were being written. Documents left in the journal by an earlier
+    process are flushed too.
+    """
+    global _writer, _worker
+    with _start_lock:
+        _writer = (insert, count, remove)
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="write-behind", daemon=True)
+            _worker.start()
+    _wake.set()